@@ -125,9 +125,9 @@ def fetch_app_details_with_retry(appid: int, session: requests.Session, max_retr
     
     for attempt in range(max_retries):
         try:
-            # Progressive delay: 1s, 2s, 4s for retries
-            base_delay = 1.0 + (attempt * 0.5)
-            time.sleep(base_delay)
+            # Back off only on retries; first-attempt pacing is the caller's --delay
+            if attempt > 0:
+                time.sleep(1.0 + (attempt * 0.5))
             
             resp = session.get(url, timeout=20)
             
@@ -16,6 +16,8 @@ from steam_unreleased_tags_scraper import (
     fetch_full_applist, 
     search_by_batch,
     export_results,
+    current_run_date,
+    merge_checkpoint_results,
     logger,
     ALL_TARGET_TAGS
 )
@@ -34,8 +36,10 @@ def run_limited_scraper(limit: int = 1000):
     
     logger.info(f"Processing {len(limited_apps)} most recent apps...")
     
-    # 处理应用
-    results = search_by_batch(limited_apps, 1, 1)
+    # 处理应用；当天已检查过的应用会被跳过，其命中结果从检查点文件读回
+    run_date = current_run_date()
+    results = search_by_batch(limited_apps, 1, 1, run_date)
+    results = merge_checkpoint_results(results, run_date, set(limited_apps))
     
     # 导出结果
     if results:
@@ -12,13 +12,20 @@ from typing import List, Dict, Set, Optional
 import logging
 from dateutil import parser as dateparser
 from difflib import SequenceMatcher
+from functools import lru_cache
 from xml.etree import ElementTree as ET
 import time
 import html
+from array import array
+from bisect import bisect_left
 
+import ijson
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from requests_cache import CachedSession, DO_NOT_CACHE
 from dotenv import load_dotenv
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 
 # Constants
 APPLIST_URL = "https://api.steampowered.com/ISteamApps/GetAppList/v2/"
@@ -28,7 +35,10 @@ STEAMDB_URL = "https://steamdb.info/app/{appid}/"
 DATA_DIR = Path(__file__).parent / "steam_data"
 EXPORT_DIR = Path(__file__).parent / "exports"
 KNOWN_APPS_FILE = DATA_DIR / "applist.json"
+KNOWN_APPS_BIN = DATA_DIR / "applist.bin"  # sorted int32 copy of applist.json for fast loading
 WATCHLIST_FILE = DATA_DIR / "early_stage_watchlist.json"  # New file for tracking early-stage apps
+API_CACHE_FILE = DATA_DIR / "steam_daily_cache"  # requests-cache SQLite file (.sqlite appended)
+APPDETAILS_CACHE_TTL = 86400  # seconds
 
 # Words that indicate different versions of the same game
 VERSION_SUFFIXES = {
@@ -103,22 +113,64 @@ logger = logging.getLogger("steam_daily")
 
 MAX_WORKERS = int(os.environ.get("MAX_WORKERS", "32"))
 
-def fetch_full_applist() -> List[Dict]:
-    """Download the full Steam app list."""
-    resp = requests.get(APPLIST_URL, timeout=30)
+# 所有线程共享一个带连接池的 Session，复用 keep-alive 连接，避免每个请求重新握手 TCP+TLS。
+# appdetails 成功响应落盘缓存 24h（崩溃后重跑几乎不再请求）；applist、关注者、SteamDB 需要当天数据，不缓存
+SESSION = CachedSession(
+    cache_name=str(API_CACHE_FILE),
+    backend="sqlite",
+    expire_after=DO_NOT_CACHE,
+    urls_expire_after={"store.steampowered.com/api/appdetails": APPDETAILS_CACHE_TTL},
+    allowable_codes=(200,),
+)
+_adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS * 2, max_retries=0)
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
+
+# 导出时需要二次清理 HTML 的字段；超过一个块的行数才启用多进程清理
+CLEAN_FIELDS = {"name", "description", "developers", "publishers", "categories", "genres"}
+CLEAN_CHUNK_SIZE = 1000
+PANDAS_EXPORT_THRESHOLD = 500
+
+def fetch_applist_ids() -> Set[int]:
+    """Stream the full Steam app list and keep only the app IDs."""
+    resp = SESSION.get(APPLIST_URL, timeout=30, stream=True)
     resp.raise_for_status()
-    data = resp.json()
-    return data.get("applist", {}).get("apps", [])
+    resp.raw.decode_content = True  # transparently gunzip
+    try:
+        # 只解析出 appid 整数，不在内存中构建整份 applist 字典列表
+        return set(ijson.items(resp.raw, "applist.apps.item.appid"))
+    finally:
+        resp.close()
 
-def load_known_appids() -> set:
+def load_known_appids() -> array:
+    """Load known app IDs as a sorted int32 array (~4 bytes/ID instead of a ~28-byte set entry)."""
+    # 优先读取二进制副本（直接 memcpy），仅当它不比 applist.json 旧时才可信
+    if KNOWN_APPS_BIN.exists() and (
+        not KNOWN_APPS_FILE.exists()
+        or KNOWN_APPS_BIN.stat().st_mtime >= KNOWN_APPS_FILE.stat().st_mtime
+    ):
+        known = array("i")
+        with KNOWN_APPS_BIN.open("rb") as f:
+            known.frombytes(f.read())
+        return known
     if KNOWN_APPS_FILE.exists():
-        with KNOWN_APPS_FILE.open("r", encoding="utf-8") as f:
-            return set(json.load(f))
-    return set()
+        with KNOWN_APPS_FILE.open("rb") as f:
+            return array("i", sorted(orjson.loads(f.read())))
+    return array("i")
+
+def is_known_appid(known_ids: array, app_id: int) -> bool:
+    """Binary-search membership test on the sorted array from load_known_appids"""
+    i = bisect_left(known_ids, app_id)
+    return i < len(known_ids) and known_ids[i] == app_id
 
 def save_known_appids(app_ids: set):
-    with KNOWN_APPS_FILE.open("w", encoding="utf-8") as f:
-        json.dump(sorted(app_ids), f)
+    ordered = sorted(app_ids)
+    # applist.json 保留为快照格式（backfill_merge.py --diff-applists 读取）
+    with KNOWN_APPS_FILE.open("wb") as f:
+        f.write(orjson.dumps(ordered))
+    # 紧凑的 int32 二进制副本，供下次运行快速加载
+    with KNOWN_APPS_BIN.open("wb") as f:
+        array("i", ordered).tofile(f)
 
 def load_watchlist() -> Dict:
     """Load the early-stage app watchlist"""
@@ -167,12 +219,15 @@ def update_watchlist_entry(watchlist: Dict, app_id: int, status: str, details: D
 def fetch_app_details(appid: int) -> Dict:
     url = DETAILS_URL_TEMPLATE.format(appid=appid)
     try:
-        resp = requests.get(url, timeout=30)
+        resp = SESSION.get(url, timeout=30)
         resp.raise_for_status()
-        data = resp.json().get(str(appid), {})
+        data = orjson.loads(resp.content).get(str(appid), {})
         
         # Enhanced response handling for early-stage apps
         if not data.get("success"):
+            # 失败结果不缓存：观察列表每天都要重新检查
+            if not resp.from_cache:
+                SESSION.cache.delete(urls=[url])
             # Even failed API calls can give us valuable info about early apps
             return {"_api_response": "failed", "_app_id": appid}
         
@@ -186,7 +241,7 @@ def fetch_app_details(appid: int) -> Dict:
 
 def fetch_follower_count(appid: int, session: requests.Session = None) -> Optional[int]:
     """获取Steam社区关注者数量"""
-    sess = session or requests.Session()
+    sess = session or SESSION
     headers = {
         "User-Agent": "Mozilla/5.0 (FollowerBot/1.0)",
         "Cookie": "birthtime=0"   # 绕过年龄墙
@@ -214,7 +269,7 @@ def estimate_wishlists(followers: int, genres: Optional[List[str]] = None) -> in
 
 def fetch_wishlist_rank(appid: int, session: requests.Session = None) -> int | None:
     """获取SteamDB愿望单排名"""
-    sess = session or requests.Session()
+    sess = session or SESSION
     headers = {
         "User-Agent": "Mozilla/5.0 (SteamDBBot/1.0)"
     }
@@ -249,7 +304,7 @@ def clean_text_content(text: str) -> str:
 
 def fetch_wishlist_data(appid: int, details: Dict = None, session: requests.Session = None) -> Dict:
     """获取完整的愿望单估算数据"""
-    sess = session or requests.Session()
+    sess = session or SESSION
     
     # 获取关注者数
     followers = fetch_follower_count(appid, sess)
@@ -291,7 +346,7 @@ def get_game_details(appid: int, session: requests.Session) -> Dict:
         url = DETAILS_URL_TEMPLATE.format(appid=appid)
         response = session.get(url, timeout=10)
         response.raise_for_status()
-        data = response.json()
+        data = orjson.loads(response.content)
         
         if str(appid) in data and data[str(appid)]['success']:
             game_data = data[str(appid)]['data']
@@ -366,6 +421,12 @@ def get_game_details(appid: int, session: requests.Session) -> Dict:
         logging.error(f"获取游戏 {appid} 详情时出错: {e}")
         return None
 
+def is_released(details: Dict) -> bool:
+    """Steam explicitly marks the app as released (coming_soon is False)"""
+    if not details:
+        return False
+    return (details.get("release_date") or {}).get("coming_soon") is False
+
 def build_row(details: Dict, app_id: int = None, wishlist_data: Dict = None) -> Dict:
     """Enhanced to capture early-stage apps with minimal data and wishlist estimation"""
     discovery_date = datetime.now(timezone.utc).strftime("%Y-%m-%d")
@@ -427,10 +488,10 @@ def build_row(details: Dict, app_id: int = None, wishlist_data: Dict = None) ->
     # Handle apps with full details (legacy data structure)
     name = details.get("name")
     if name:
-        # Check if it's a released game we should skip
-        release_info = details.get("release_date", {})
-        if release_info.get("coming_soon") is False:  # Explicitly released
+        # Check if it's a released game we should skip, before any string work
+        if is_released(details):  # Explicitly released
             return {}  # Skip clearly released games
+        release_info = details.get("release_date") or {}
         
         # Include unreleased games with full store pages
         detection_stage = "public_unreleased" if release_info.get("coming_soon") else "minimal_data"
@@ -489,27 +550,53 @@ def build_row(details: Dict, app_id: int = None, wishlist_data: Dict = None) ->
         "discovery_date": discovery_date
     }
 
+def _clean_row(row: Dict) -> Dict:
+    """清理行数据中的文本字段"""
+    cleaned_row = {}
+    for key, value in row.items():
+        if isinstance(value, str) and value:
+            # 对可能包含HTML实体的字段进行额外清理
+            if key in CLEAN_FIELDS:
+                cleaned_row[key] = clean_text_content(value)
+            else:
+                cleaned_row[key] = value
+        else:
+            cleaned_row[key] = value
+    return cleaned_row
+
+def _clean_chunk(rows: List[Dict]) -> List[Dict]:
+    """在子进程中批量清理一组行（需为模块级函数以便 pickle）"""
+    return [_clean_row(row) for row in rows]
+
+def iter_cleaned_rows(rows: List[Dict]):
+    """按块产出清理后的行；行数较多时把正则清理分摊到多个进程"""
+    if len(rows) <= CLEAN_CHUNK_SIZE:
+        yield _clean_chunk(rows)
+        return
+    chunks = [rows[i:i + CLEAN_CHUNK_SIZE] for i in range(0, len(rows), CLEAN_CHUNK_SIZE)]
+    with ProcessPoolExecutor(max_workers=min(len(chunks), os.cpu_count() or 1)) as pool:
+        # map 保持输入顺序，主线程边收结果边写文件
+        yield from pool.map(_clean_chunk, chunks)
+
 def export_csv(rows: List[Dict]) -> Path:
     today_str = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     file_path = EXPORT_DIR / f"new_games_{today_str}.csv"
     
+    # 行数较多时交给 pandas 批量写出；少量行保持 csv 路径，省去导入 pandas 的开销
+    if len(rows) > PANDAS_EXPORT_THRESHOLD:
+        import pandas as pd
+        cleaned = [row for chunk in iter_cleaned_rows(rows) for row in chunk]
+        # dtype=object 保持整数列（followers 等含空值）不被转成浮点，输出与 csv 路径一致
+        df = pd.DataFrame(cleaned, columns=FIELDS, dtype=object)
+        df.to_csv(file_path, index=False, encoding="utf-8-sig", lineterminator="\r\n")
+        return file_path
+    
     # 使用utf-8-sig编码确保Windows正确显示中文（添加BOM头）
     with file_path.open("w", encoding="utf-8-sig", newline="") as f:
         writer = csv.DictWriter(f, fieldnames=FIELDS)
         writer.writeheader()
-        for row in rows:
-            # 清理行数据中的文本字段
-            cleaned_row = {}
-            for key, value in row.items():
-                if isinstance(value, str) and value:
-                    # 对可能包含HTML实体的字段进行额外清理
-                    if key in ['name', 'description', 'developers', 'publishers', 'categories', 'genres']:
-                        cleaned_row[key] = clean_text_content(value)
-                    else:
-                        cleaned_row[key] = value
-                else:
-                    cleaned_row[key] = value
-            writer.writerow(cleaned_row)
+        for cleaned_rows in iter_cleaned_rows(rows):
+            writer.writerows(cleaned_rows)
     return file_path
 
 def send_email(csv_path: Path):
@@ -677,6 +764,7 @@ def create_test_csv() -> Path:
     
     return file_path
 
+@lru_cache(maxsize=8192)
 def normalize_game_name(name: str) -> str:
     """Normalize game name for similarity comparison"""
     if not name:
@@ -723,17 +811,28 @@ def calculate_name_similarity(name1: str, name2: str) -> float:
 def find_similar_games(new_name: str, existing_games: List[Dict], threshold: float = 0.85) -> List[Dict]:
     """Find games with similar names in the existing list"""
     similar_games = []
+    if not new_name:
+        return similar_games
+    
+    # 归一化结果由 normalize_game_name 的 lru_cache 缓存，同一列表被反复比对时不再重复跑正则，
+    # 也不往调用方的 game 字典里写私有字段
+    norm_new = normalize_game_name(new_name)
+    if not norm_new:
+        return similar_games
     
     for game in existing_games:
-        existing_name = game.get("name", "")
-        similarity = calculate_name_similarity(new_name, existing_name)
+        norm_existing = normalize_game_name(game.get("name", ""))
+        if not norm_existing:
+            continue
+        
+        similarity = SequenceMatcher(None, norm_new, norm_existing).ratio()
         
         if similarity >= threshold:
             similar_games.append({
                 "game": game,
                 "similarity": similarity,
-                "normalized_new": normalize_game_name(new_name),
-                "normalized_existing": normalize_game_name(existing_name)
+                "normalized_new": norm_new,
+                "normalized_existing": norm_existing
             })
     
     # Sort by similarity (highest first)
@@ -786,90 +885,98 @@ def main():
     logger.info("Known app count: %s", len(known_ids))
     logger.info("Watchlist app count: %s", len(watchlist))
 
-    # Step 1: Check existing watchlist apps for changes
-    watchlist_promotions = []
-    if args.check_watchlist and watchlist:
-        logger.info("Checking %d watchlist apps for changes...", len(watchlist))
+    # 观察列表检查与新应用抓取共用一个线程池，避免每个阶段重建线程
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as exe:
+        # Step 1: Check existing watchlist apps for changes
+        watchlist_promotions = []
+        pending_updates = []  # (app_id, status, details) applied to the watchlist after each phase
+        if args.check_watchlist and watchlist:
+            logger.info("Checking %d watchlist apps for changes...", len(watchlist))
         
-        def _watchlist_task(aid):
-            return aid, fetch_app_details(aid)
+            def _watchlist_task(aid):
+                return aid, fetch_app_details(aid)
         
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as exe:
             watchlist_futures = {exe.submit(_watchlist_task, int(aid)): aid for aid in watchlist.keys()}
             for fut in as_completed(watchlist_futures):
                 aid_str = watchlist_futures[fut]
                 aid_int = int(aid_str)
                 details = fut.result()[1]
-                
+            
                 # Determine new status
                 if details and details.get("_api_response") == "success" and details.get("name"):
-                    # App became accessible! Fetch wishlist data too
-                    wishlist_data = fetch_wishlist_data(aid_int, details)
-                    row = build_row(details, aid_int, wishlist_data)
+                    # App became accessible! Fetch wishlist data too (released apps are filtered anyway)
+                    row = {}
+                    if not is_released(details):
+                        wishlist_data = fetch_wishlist_data(aid_int, details)
+                        row = build_row(details, aid_int, wishlist_data)
                     if row:
                         watchlist_promotions.append((aid_int, details, row))
                         logger.info("🎉 Watchlist app %s became accessible: %s (followers: %s, est. wishlists: %s)", 
                                   aid_int, details.get("name"), 
                                   wishlist_data.get("followers"), wishlist_data.get("wishlists_est"))
-                    # Update watchlist entry
-                    update_watchlist_entry(watchlist, aid_int, "accessible", details)
+                        # Promoted apps are removed from the watchlist below, no entry update needed
+                    else:
+                        pending_updates.append((aid_int, "accessible", details))
                 else:
                     # Still inaccessible
                     status = details.get("_api_response", "no_response") if details else "no_response"
-                    update_watchlist_entry(watchlist, aid_int, status)
+                    pending_updates.append((aid_int, status, None))
         
-        if watchlist_promotions:
-            logger.info("Found %d watchlist apps that became accessible", len(watchlist_promotions))
-
-    # Step 2: Process new apps from Steam applist
-    applist = fetch_full_applist()
-    latest_ids = {app["appid"] for app in applist}
-    new_ids = latest_ids - known_ids
-    
-    if not new_ids and not watchlist_promotions:
-        logger.info("No new app_ids detected and no watchlist changes.")
-        if args.check_watchlist:
-            save_watchlist(watchlist)
-        save_known_appids(latest_ids)
-        return
+            # Apply watchlist updates in one pass once all checks are in
+            for aid_int, status, details in pending_updates:
+                update_watchlist_entry(watchlist, aid_int, status, details)
+            pending_updates.clear()
+        
+            if watchlist_promotions:
+                logger.info("Found %d watchlist apps that became accessible", len(watchlist_promotions))
 
-    logger.info("Detected %s new app_ids. Fetching details …", len(new_ids))
-    rows = []
-    total_fetched = 0
-    already_released_filtered = 0
-    new_to_watchlist = 0
-    
-    def _task(aid):
-        details = fetch_app_details(aid)
-        # 只为有成功响应的应用获取wishlist数据
-        wishlist_data = None
-        if details and details.get("_api_response") == "success" and details.get("name"):
-            wishlist_data = fetch_wishlist_data(aid, details)
-        return aid, details, wishlist_data
-
-    early_stage_count = 0
-    public_unreleased_count = 0
-    minimal_data_count = 0
-    
-    # Process new apps
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as exe:
+        # Step 2: Process new apps from Steam applist
+        latest_ids = fetch_applist_ids()
+        new_ids = {aid for aid in latest_ids if not is_known_appid(known_ids, aid)}
+    
+        if not new_ids and not watchlist_promotions:
+            logger.info("No new app_ids detected and no watchlist changes.")
+            if args.check_watchlist:
+                save_watchlist(watchlist)
+            save_known_appids(latest_ids)
+            return
+
+        logger.info("Detected %s new app_ids. Fetching details …", len(new_ids))
+        rows = []
+        total_fetched = 0
+        already_released_filtered = 0
+        new_to_watchlist = 0
+    
+        def _task(aid):
+            details = fetch_app_details(aid)
+            # 只为有成功响应且未发布的应用获取wishlist数据（已发布的会被 build_row 过滤）
+            wishlist_data = None
+            if details and details.get("_api_response") == "success" and details.get("name") and not is_released(details):
+                wishlist_data = fetch_wishlist_data(aid, details)
+            return aid, details, wishlist_data
+
+        early_stage_count = 0
+        public_unreleased_count = 0
+        minimal_data_count = 0
+    
+        # Process new apps
         futures = {exe.submit(_task, aid): aid for aid in new_ids}
         for idx, fut in enumerate(as_completed(futures), start=1):
             total_fetched += 1
             aid, details, wishlist_data = fut.result()
             row = build_row(details, aid, wishlist_data)
-            
+        
             if not row and details:  # Details exist but filtered by date (released games)
                 already_released_filtered += 1
             elif row:
                 stage = row.get("detection_stage", "unknown")
-                
+            
                 if stage == "early_stage":
                     # Add to watchlist instead of main applist
                     early_stage_count += 1
                     new_to_watchlist += 1
                     status = details.get("_api_response", "no_response") if details else "no_response"
-                    update_watchlist_entry(watchlist, aid, status, details)
+                    pending_updates.append((aid, status, details))
                     logger.info("Added app %s to watchlist (early stage)", aid)
                 else:
                     # Add to regular results
@@ -878,17 +985,19 @@ def main():
                         public_unreleased_count += 1
                     elif stage == "minimal_data":
                         minimal_data_count += 1
-                        
+                    
             if idx % 100 == 0:
                 logger.info("Fetched details for %d/%d apps", idx, len(new_ids))
 
+    for aid, status, details in pending_updates:
+        update_watchlist_entry(watchlist, aid, status, details)
+
     # Add promoted watchlist apps to results
     for aid_int, details, row in watchlist_promotions:
         rows.append(row)
-        # Remove from watchlist and add to known apps
+        # Remove from watchlist; it is in latest_ids, so it is saved as a known app below
         if str(aid_int) in watchlist:
             del watchlist[str(aid_int)]
-        known_ids.add(aid_int)
 
     logger.info("Discovery summary: %d apps processed, %d released (filtered), %d early-stage (watchlisted), %d public unreleased, %d minimal data", 
             total_fetched, already_released_filtered, early_stage_count, public_unreleased_count, minimal_data_count)
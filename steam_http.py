@@ -0,0 +1,88 @@
+"""
+各 Steam 爬虫共用的 HTTP 工具：全局令牌桶限速与按并发数配置的连接池。
+
+由 steam_recent_tag_scraper / steam_search_tag_scraper / steam_unreleased_tags_scraper 导入。
+"""
+
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger("steam_http")
+
+
+class TokenBucket:
+    """线程安全的令牌桶：所有 worker 共享一个全局请求速率，而不是各自固定 sleep。
+
+    调用方可在收到 429 时调用 on_rate_limited() 把速率减半，之后每连续 recover_after 次成功
+    调用 on_success() 把速率提高 25%，直到回到配置的上限；不调用这两个钩子时速率保持固定。
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0, min_rate: float = 0.05, recover_after: int = 50):
+        self._cond = threading.Condition(threading.Lock())
+        self.min_rate = min_rate
+        self.recover_after = recover_after
+        self.configure(rate, capacity)
+
+    def configure(self, rate: float, capacity: float = 1.0) -> None:
+        with self._cond:
+            self.rate = rate
+            self.max_rate = rate
+            self.capacity = max(capacity, 1.0)
+            self._tokens = self.capacity
+            self._last = time.monotonic()
+            self._ok_streak = 0
+
+    def acquire(self) -> None:
+        """阻塞直到拿到一个令牌；rate <= 0 表示不限速。"""
+        if self.rate <= 0:
+            return
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                self._cond.wait((1 - self._tokens) / self.rate)
+
+    def on_rate_limited(self) -> None:
+        with self._cond:
+            self._ok_streak = 0
+            new_rate = max(min(self.min_rate, self.max_rate), self.rate / 2)
+            if new_rate < self.rate:
+                logger.warning(f"Rate limited, lowering request rate to {new_rate:.2f} req/s")
+            self.rate = new_rate
+
+    def on_success(self) -> None:
+        with self._cond:
+            if self.rate >= self.max_rate:
+                return
+            self._ok_streak += 1
+            if self._ok_streak >= self.recover_after:
+                self._ok_streak = 0
+                self.rate = min(self.max_rate, self.rate * 1.25)
+
+
+def configure_session(session: requests.Session, workers: int, backoff_factor: float = 0.5,
+                      raise_on_status: bool = True) -> None:
+    """按并发数挂载连接池（线程数超过默认池大小 10 时不再反复建连），5xx/429 先在适配器内退避重试。
+
+    raise_on_status=False 时重试用尽后把最后的响应交回调用方，由调用方自行处理 429。
+    """
+    retry = Retry(
+        total=3,
+        backoff_factor=backoff_factor,
+        status_forcelist=[429, 500, 502, 503, 504],
+        respect_retry_after_header=True,
+        allowed_methods=["GET"],
+        raise_on_status=raise_on_status,
+    )
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers * 2, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
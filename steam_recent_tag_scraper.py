@@ -15,20 +15,29 @@ Steam 高 AppID（最新）标签爬虫 - 快速且稳定（重构版）
 
 import argparse
 import csv
+import heapq
 import html
 import logging
 import re
-import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
+import ijson
+import orjson
 import requests
+from requests_cache import CachedSession, DO_NOT_CACHE
+
+from steam_http import TokenBucket, configure_session
 
 APPLIST_URL = "https://api.steampowered.com/ISteamApps/GetAppList/v2/"
-APPDETAILS_TPL = "https://store.steampowered.com/api/appdetails?appids={appid}&cc=us&l=en"
+# filters= 只返回匹配与导出用到的字段（不含截图、视频、配置需求等），响应体积约缩小一个数量级
+APPDETAILS_TPL = (
+    "https://store.steampowered.com/api/appdetails?appids={appid}&cc=us&l=en"
+    "&filters=basic,genres,categories,release_date,short_description,developers,publishers,website,supported_languages,type"
+)
 
 # 目标分类标签（基于 appdetails 的 genres/categories 文本做包含匹配）
 # 注意：Steam API 的 genres/categories 字段有限，需要更宽松的匹配
@@ -39,6 +48,17 @@ TAG_CATEGORIES: Dict[str, List[str]] = {
     "cozy": ["Cozy", "Relaxing", "Wholesome", "Casual", "Peaceful", "Zen", "Family Friendly", "Simulation"],
 }
 
+# 预先小写化的目标标签，避免每次匹配重复 lower()
+TAG_CATEGORIES_LOWER: Dict[str, Tuple[str, ...]] = {
+    cat: tuple(t.lower() for t in targets) for cat, targets in TAG_CATEGORIES.items()
+}
+
+# narrative / emotional 额外的宽松关键词（同时匹配名称与描述）
+CATEGORY_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "narrative": ("story", "narrative", "tale", "adventure", "rpg", "visual novel", "choices", "decision"),
+    "emotional": ("emotional", "drama", "psychological", "atmospheric", "deep", "meaningful", "touching", "heart"),
+}
+
 FIELDS = [
     "name",
     "steam_appid",
@@ -67,127 +87,149 @@ DEFAULT_HEADERS = {
 BASE_DIR = Path(__file__).parent
 EXPORT_DIR = BASE_DIR / "exports"
 EXPORT_DIR.mkdir(exist_ok=True)
+DATA_DIR = BASE_DIR / "steam_data"
+DATA_DIR.mkdir(exist_ok=True)
+API_CACHE_FILE = DATA_DIR / "steam_recent_cache"  # requests-cache SQLite 文件（自动加 .sqlite）
+APPDETAILS_CACHE_TTL = timedelta(hours=24)
+FAILED_CACHE_TTL = timedelta(hours=6)
+
+# 预编译的清洗正则
+_TAG_RE = re.compile(r"<[^>]+>")
+_WS_RE = re.compile(r"\s+")
+
+# applist 名称明显不是游戏本体（原声、Demo、DLC、服务端等）的条目，直接跳过详情请求
+_SKIP_RE = re.compile(r"(?i)\b(soundtrack|ost|demo|dlc|dedicated server|trailer|artbook|wallpaper)\b")
+
+# release_date 文本中表示尚未发售的字样（TBA、Coming soon 等）
+_UNRELEASED_RE = re.compile(r"(?i)\b(tba|coming|soon)\b")
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)-8s | %(message)s", datefmt="%H:%M:%S")
 logger = logging.getLogger("steam_recent")
 
+# 模块级共享 Session：applist 与所有 worker 线程复用同一个 keep-alive 连接池。
+# appdetails 响应落盘缓存（成功 24h，success=false 6h），重跑/中断恢复时几乎不再请求网络
+SESSION = CachedSession(
+    cache_name=str(API_CACHE_FILE),
+    backend="sqlite",
+    expire_after=DO_NOT_CACHE,
+    urls_expire_after={"store.steampowered.com/api/appdetails": APPDETAILS_CACHE_TTL},
+    allowable_codes=(200,),
+)
+SESSION.headers.update(DEFAULT_HEADERS)
+
+
+# 默认按 6 并发 / 0.6s 延迟 ≈ 10 req/s；run() 会按命令行参数重新配置
+BUCKET = TokenBucket(rate=6 / 0.6, capacity=6)
+
 
 def clean_text(text: str) -> str:
     if not text:
         return ""
-    text = html.unescape(text)
-    text = re.sub(r"<[^>]+>", " ", text)
-    text = re.sub(r"\s+", " ", text)
-    return text.strip()
+    return _WS_RE.sub(" ", _TAG_RE.sub(" ", html.unescape(text))).strip()
 
 
-def fetch_full_applist(session: requests.Session) -> List[Dict]:
-    resp = session.get(APPLIST_URL, timeout=30)
+def iter_full_applist(session: requests.Session) -> Iterator[Dict]:
+    """流式解析 applist，逐个产出 {"appid", "name"}，不在内存中保留整份列表。"""
+    resp = session.get(APPLIST_URL, timeout=30, stream=True)
     resp.raise_for_status()
-    data = resp.json()
-    return data.get("applist", {}).get("apps", [])
+    resp.raw.decode_content = True  # 透明解压 gzip
+    try:
+        yield from ijson.items(resp.raw, "applist.apps.item")
+    finally:
+        resp.close()
+
+
+def looks_like_nongame(name: Optional[str]) -> bool:
+    return bool(name and _SKIP_RE.search(name))
 
 
 def is_unreleased(details: Dict) -> bool:
     if details.get("type") != "game":
         return False
-    rd = details.get("release_date", {}) or {}
-    if rd.get("coming_soon") is True:
-        return True
-    if rd.get("coming_soon") is False:
-        return False
+    rd = details.get("release_date") or {}
+    cs = rd.get("coming_soon")
+    if cs is not None:
+        return bool(cs)
     # 模糊日期：有时 date 是 TBA/Coming soon
-    date_text = (rd.get("date") or "").lower()
-    if any(x in date_text for x in ["tba", "coming", "soon"]):
-        return True
-    return False
+    return bool(_UNRELEASED_RE.search(rd.get("date") or ""))
 
 
-def match_category(details: Dict, category: str) -> bool:
-    targets = TAG_CATEGORIES.get(category, [])
+def prepare_match_texts(details: Dict) -> Tuple[List[str], str, List[str], str]:
+    """每个 app 只计算一次小写文本，返回 (texts, joined, texts_ext, joined_ext) 供所有分类复用；不修改 details。"""
     texts: List[str] = []
-    
-    # 收集 genres
-    for g in details.get("genres", []) or []:
-        d = g.get("description")
-        if d:
-            texts.append(d)
-    
-    # 收集 categories
-    for c in details.get("categories", []) or []:
-        d = c.get("description")
-        if d:
-            texts.append(d)
-    
-    # 对于 narrative 和 emotional，也检查游戏描述和名称
-    if category in ["narrative", "emotional"]:
-        # 添加游戏名称
-        name = details.get("name", "")
-        if name:
-            texts.append(name)
-        
-        # 添加简短描述（前100字符）
-        desc = details.get("short_description", "")
-        if desc and len(desc) > 0:
-            texts.append(desc[:200])  # 检查描述的前200字符
-    
-    if not texts:
+    # 收集 genres 与 categories
+    for key in ("genres", "categories"):
+        for item in details.get(key, []) or []:
+            d = item.get("description")
+            if d:
+                texts.append(d.lower())
+
+    # narrative / emotional 额外检查游戏名称与简短描述（前200字符）
+    extra = list(texts)
+    name = details.get("name", "")
+    if name:
+        extra.append(name.lower())
+    desc = details.get("short_description", "")
+    if desc:
+        extra.append(desc[:200].lower())
+
+    # 用换行拼接：目标词不含换行，不会跨文本误命中
+    return texts, "\n".join(texts), extra, "\n".join(extra)
+
+
+def match_category(details: Dict, category: str,
+                   match_texts: Optional[Tuple[List[str], str, List[str], str]] = None) -> bool:
+    """match_texts 为 prepare_match_texts 的结果；多分类匹配时由调用方算好传入。"""
+    if match_texts is None:
+        match_texts = prepare_match_texts(details)
+    texts, joined_texts, texts_ext, joined_ext = match_texts
+
+    keywords = CATEGORY_KEYWORDS.get(category)
+    if keywords:
+        lower, joined = texts_ext, joined_ext
+    else:
+        lower, joined = texts, joined_texts
+
+    if not lower:
         return False
-    
-    lower = [t.lower() for t in texts]
-    
-    # 特殊处理：narrative 类别的更宽松匹配
-    if category == "narrative":
-        narrative_keywords = ["story", "narrative", "tale", "adventure", "rpg", "visual novel", "choices", "decision"]
-        for keyword in narrative_keywords:
-            if any(keyword in text for text in lower):
-                return True
-    
-    # 特殊处理：emotional 类别的更宽松匹配
-    if category == "emotional":
-        emotional_keywords = ["emotional", "drama", "psychological", "atmospheric", "deep", "meaningful", "touching", "heart"]
-        for keyword in emotional_keywords:
-            if any(keyword in text for text in lower):
-                return True
-    
-    # 标准匹配
-    for target in targets:
-        tl = target.lower()
-        if any(tl in x or x in tl for x in lower):
+
+    # narrative / emotional 的宽松关键词匹配
+    if keywords and any(k in joined for k in keywords):
+        return True
+
+    # 标准匹配（目标词包含于文本，或文本包含于目标词）
+    for tl in TAG_CATEGORIES_LOWER.get(category, ()):
+        if tl in joined or any(x in tl for x in lower):
             return True
     return False
 
 
-def fetch_details_with_retry(appid: int, session: requests.Session, delay: float) -> Optional[Dict]:
-    """单次请求详情，带轻量重试与指数退避。"""
+def fetch_details_with_retry(appid: int, session: CachedSession) -> Optional[Dict]:
+    """单次请求详情：优先读磁盘缓存；网络请求走全局令牌桶限速，429/5xx 的重试与退避由 session 上挂载的 urllib3.Retry 处理。"""
     url = APPDETAILS_TPL.format(appid=appid)
-    tries = 3
-    backoff = delay
-    for i in range(tries):
-        time.sleep(backoff)
-        try:
-            resp = session.get(url, headers=DEFAULT_HEADERS, timeout=20)
-            if resp.status_code == 429:  # 限流
-                sleep_s = 5 * (i + 1)
-                logger.debug(f"429 for {appid}, sleep {sleep_s}s")
-                time.sleep(sleep_s)
-                backoff *= 1.5
-                continue
-            if resp.status_code == 403:
-                return None
-            resp.raise_for_status()
-            data = resp.json().get(str(appid), {})
-            if not data.get("success"):
-                return None
-            return data.get("data", {})
-        except Exception:
-            if i == tries - 1:
-                return None
-            backoff *= 1.5
-    return None
-
-
-def build_row(details: Dict, category: str) -> Dict:
+    try:
+        # 先查磁盘缓存，未命中（504）才消耗限速令牌走网络
+        resp = session.get(url, timeout=20, only_if_cached=True)
+        if resp.status_code == 504:
+            BUCKET.acquire()
+            resp = session.get(url, timeout=20)
+        if resp.status_code == 403:
+            return None
+        resp.raise_for_status()
+        data = orjson.loads(resp.content).get(str(appid), {})
+    except Exception as e:
+        logger.debug(f"appdetails failed for {appid}: {e}")
+        return None
+    if not data.get("success"):
+        # 失败结果改用较短的缓存时间
+        if not resp.from_cache:
+            session.cache.save_response(resp, expires=datetime.now(timezone.utc) + FAILED_CACHE_TTL)
+        return None
+    return data.get("data", {})
+
+
+def build_base(details: Dict) -> Dict:
+    """构建与分类无关的行字段；同一 app 命中多个分类时只算一次。"""
     rd = (details.get("release_date") or {})
     release_date = rd.get("date") or ""
     desc = details.get("short_description") or ""
@@ -204,7 +246,6 @@ def build_row(details: Dict, category: str) -> Dict:
         "steam_url": f"https://store.steampowered.com/app/{details.get('steam_appid','')}/",
         "release_date": release_date,
         "coming_soon": True,
-        "tag_category": category,
         "genres": genres,
         "categories": cats,
         "developers": devs,
@@ -216,6 +257,23 @@ def build_row(details: Dict, category: str) -> Dict:
     }
 
 
+def build_row(details: Dict, category: str) -> Dict:
+    return {**build_base(details), "tag_category": category}
+
+
+def match_and_build(details: Dict, categories: List[str]) -> List[Tuple[str, Dict]]:
+    """对单个 app 做全部分类匹配，返回 [(分类, 行), ...]；纯函数，无 I/O。"""
+    match_texts = prepare_match_texts(details)
+    out: List[Tuple[str, Dict]] = []
+    base: Optional[Dict] = None
+    for cat in categories:
+        if match_category(details, cat, match_texts):
+            if base is None:
+                base = build_base(details)
+            out.append((cat, {**base, "tag_category": cat}))
+    return out
+
+
 def open_writers(categories: List[str]) -> Tuple[Dict[str, csv.DictWriter], Dict[str, Path], Dict[str, any]]:
     """为每个分类打开一个 CSV 写入器，返回 writers、paths、files。"""
     today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
@@ -224,7 +282,7 @@ def open_writers(categories: List[str]) -> Tuple[Dict[str, csv.DictWriter], Dict
     files: Dict[str, any] = {}
     for cat in categories:
         out = EXPORT_DIR / f"steam_recent_{cat}_unreleased_{today}.csv"
-        f = out.open("w", encoding="utf-8-sig", newline="")
+        f = out.open("w", encoding="utf-8-sig", newline="", buffering=1 << 20)  # 1MB 缓冲，减少小写入
         w = csv.DictWriter(f, fieldnames=FIELDS)
         w.writeheader()
         writers[cat] = w
@@ -241,55 +299,64 @@ def close_files(files: Dict[str, any]) -> None:
 
 
 def run(categories: List[str], top_k: int, workers: int, delay: float, batch_size: int, progress_every: int) -> None:
-    session = requests.Session()
+    session = SESSION
+    configure_session(session, workers, backoff_factor=delay)
+    # 总速率 = workers / delay，与原先每线程 sleep(delay) 的礼貌程度一致，但空闲额度不再浪费
+    BUCKET.configure(rate=workers / delay if delay > 0 else 0, capacity=workers)
     try:
-        apps = fetch_full_applist(session)
-        appids_all = sorted([a["appid"] for a in apps], reverse=True)[:top_k]
+        # 小顶堆取最大的 top_k 个 appid，无需对整份 applist 排序；按名称预先剔除非游戏条目
+        appids_all = heapq.nlargest(top_k, (
+            a["appid"] for a in iter_full_applist(session) if not looks_like_nongame(a.get("name"))
+        ))
         logger.info(f"扫描 AppID Top {top_k}，范围约 {appids_all[0]} -> {appids_all[-1]}")
 
         writers, paths, files = open_writers(categories)
         matched_counts: Dict[str, int] = {c: 0 for c in categories}
+        pending: Dict[str, List[Dict]] = {c: [] for c in categories}
 
         total = len(appids_all)
         processed = 0
 
-        # 分批处理
-        for batch_start in range(0, total, batch_size):
-            batch = appids_all[batch_start: batch_start + batch_size]
-            logger.info(f"处理批次 {batch_start//batch_size + 1} / {((total + batch_size - 1)//batch_size)}，app 数 {len(batch)}…")
-
-            def fetch_task(aid: int) -> Optional[Dict]:
-                d = fetch_details_with_retry(aid, session, delay)
-                if not d:
-                    return None
-                # 仅未发布
-                if not is_unreleased(d):
-                    return None
-                d.setdefault("steam_appid", aid)
-                return d
-
-            details_list: List[Optional[Dict]] = []
-            with ThreadPoolExecutor(max_workers=workers) as exe:
+        def fetch_task(aid: int) -> Optional[Dict]:
+            d = fetch_details_with_retry(aid, session)
+            if not d:
+                return None
+            # 仅未发布
+            if not is_unreleased(d):
+                return None
+            d.setdefault("steam_appid", aid)
+            return d
+
+        # 分批处理（线程池在所有批次间复用，避免每批重建线程）
+        with ThreadPoolExecutor(max_workers=workers) as exe:
+            for batch_start in range(0, total, batch_size):
+                batch = appids_all[batch_start: batch_start + batch_size]
+                logger.info(f"处理批次 {batch_start//batch_size + 1} / {((total + batch_size - 1)//batch_size)}，app 数 {len(batch)}…")
+
                 futures = [exe.submit(fetch_task, aid) for aid in batch]
                 for fut in as_completed(futures):
-                    details_list.append(fut.result())
+                    d = fut.result()
                     processed += 1
+                    # 每个请求完成即做分类匹配，不必等整批结束
+                    if d:
+                        for cat, row in match_and_build(d, categories):
+                            pending[cat].append(row)
+                            matched_counts[cat] += 1
                     if processed % progress_every == 0:
                         done_pct = processed * 100.0 / total
                         logger.info(f"进度: {processed}/{total} ({done_pct:.1f}%) | 命中: " + ", ".join(
                             f"{c}:{matched_counts[c]}" for c in categories
                         ))
 
-            # 分类匹配并写入
-            for d in filter(None, details_list):
+                # 每批统一写入
                 for cat in categories:
-                    if match_category(d, cat):
-                        row = build_row(d, cat)
-                        writers[cat].writerow(row)
-                        matched_counts[cat] += 1
+                    if pending[cat]:
+                        writers[cat].writerows(pending[cat])
+                        files[cat].flush()  # 每批落盘，中断时已写出的结果不丢
+                        pending[cat].clear()
 
-            # 批次总结
-            logger.info("批次完成 | 当前命中: " + ", ".join(f"{c}:{matched_counts[c]}" for c in categories))
+                # 批次总结
+                logger.info("批次完成 | 当前命中: " + ", ".join(f"{c}:{matched_counts[c]}" for c in categories))
 
         # 结束总结
         logger.info("完成扫描 | 最终命中: " + ", ".join(f"{c}:{matched_counts[c]}" for c in categories))
@@ -16,24 +16,38 @@ Steam 搜索版标签爬虫（高效、低限流）
 import os
 import re
 import csv
-import json
 import time
 import html
 import argparse
 import logging
+import sqlite3
+import threading
 from dataclasses import dataclass
-from typing import List, Dict, Optional, Tuple, Set
+from operator import attrgetter
+from typing import Deque, List, Dict, FrozenSet, Optional, Tuple, Set
 from pathlib import Path
 
+import orjson
 import requests
-from bs4 import BeautifulSoup
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from selectolax.lexbor import LexborHTMLParser
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
 
+from steam_http import TokenBucket, configure_session
+
 # 目录
 BASE_DIR = Path(__file__).parent
 EXPORT_DIR = BASE_DIR / "exports"
 EXPORT_DIR.mkdir(exist_ok=True)
+DATA_DIR = BASE_DIR / "steam_data"
+DATA_DIR.mkdir(exist_ok=True)
+
+# enrich 结果的本地缓存（appid -> 提取后的字段），重复运行时命中即不再请求网络
+DETAILS_CACHE = DATA_DIR / "appdetails_cache.sqlite"
+ENRICH_CACHE_TTL = 7 * 86400
+# 搜索分页的条件请求缓存（ETag / Last-Modified + 已解析条目），服务端返回 304 时跳过下载与解析
+SEARCH_PAGES_CACHE = DATA_DIR / "search_pages.sqlite"
 
 # 搜索接口（无限滚动 JSON）
 SEARCH_RESULTS_URL = (
@@ -47,8 +61,24 @@ DEFAULT_HEADERS = {
                    "Chrome/120.0.0.0 Safari/537.36",
     "Accept": "application/json, text/plain, */*",
     "Accept-Language": "en-US,en;q=0.9",
+    "Connection": "keep-alive",
 }
 
+APPDETAILS_URL = "https://store.steampowered.com/api/appdetails"
+# filters= 只返回 enrich 用到的字段（不含截图、视频、配置需求等），响应体积约缩小一个数量级
+APPDETAILS_FILTERS = "basic,developers,publishers,genres,categories,short_description,supported_languages,website,release_date"
+
+# enrich 时每次 appdetails 请求携带的 appid 数（Steam 实际可接受的上限约 20）
+ENRICH_BATCH_SIZE = 20
+
+# 接口一旦拒绝批量请求，本次运行内后续批次直接走单个请求，不再浪费一次往返
+_BATCH_UNSUPPORTED = threading.Event()
+
+# 搜索分页的并发请求数（同一 Session 连接池内同时在途的页数）
+PAGE_WORKERS = 4
+# 已抓取、等待主线程解析的页数上限
+PAGE_QUEUE_DEPTH = 4
+
 # 目标分类与匹配标签（基于搜索结果展示出来的标签文本做包含匹配）
 TAG_CATEGORIES: Dict[str, List[str]] = {
     "narrative": ["Story Rich", "Narrative", "Interactive Fiction", "Visual Novel", "Text-Based"],
@@ -57,6 +87,20 @@ TAG_CATEGORIES: Dict[str, List[str]] = {
     "cozy": ["Cozy", "Relaxing", "Wholesome", "Casual", "Peaceful", "Zen", "Family Friendly"],
 }
 
+# 导入时预先小写化的目标标签集合
+TAG_CATEGORIES_LOWER: Dict[str, FrozenSet[str]] = {
+    cat: frozenset(t.lower() for t in targets) for cat, targets in TAG_CATEGORIES.items()
+}
+# 每个分类的目标标签编译成一个多模式正则：一次 C 层扫描即可判断“某个目标标签出现在某个展示标签里”
+_CATEGORY_RES: Dict[str, "re.Pattern[str]"] = {
+    cat: re.compile("|".join(re.escape(t) for t in sorted(targets, key=len, reverse=True)))
+    for cat, targets in TAG_CATEGORIES_LOWER.items()
+}
+
+# 预编译正则（clean_text / enrich 每行都会调用）
+_TAG_RE = re.compile(r"<[^>]+>")
+_WS_RE = re.compile(r"\s+")
+
 FIELDS = [
     "name",
     "steam_appid",
@@ -83,6 +127,61 @@ logging.basicConfig(
 )
 logger = logging.getLogger("steam_search_tag")
 
+# 模块级共享 Session：搜索分页与 enrich 线程复用同一个 keep-alive 连接池
+SESSION = requests.Session()
+SESSION.headers.update(DEFAULT_HEADERS)
+
+configure_session(SESSION, PAGE_WORKERS, raise_on_status=False)  # 重试用尽后沿用原有的 429 长等待
+
+
+# enrich 的全局限速；默认 4 并发 / 0.5s ≈ 8 req/s，run_for_categories 会按参数重新配置
+ENRICH_BUCKET = TokenBucket(rate=4 / 0.5, capacity=4)
+
+
+class _SqliteCache:
+    """sqlite 缓存：每次运行打开一个连接，多线程共用，读写加锁；WAL 模式下与其他进程的读写互不阻塞。"""
+
+    SCHEMA = ""
+
+    def __init__(self, path: Path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(self.SCHEMA)
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class EnrichCache(_SqliteCache):
+    """enrich 结果缓存：appid -> 提取后的字段，超过 ttl 视为过期。"""
+
+    SCHEMA = "CREATE TABLE IF NOT EXISTS search_enrich (appid INTEGER PRIMARY KEY, fetched_at INTEGER, json TEXT)"
+
+    def __init__(self, path: Path, ttl: int = ENRICH_CACHE_TTL):
+        super().__init__(path)
+        self.ttl = ttl
+
+    def get(self, appid: int) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT json FROM search_enrich WHERE appid=? AND fetched_at > ?",
+                (appid, int(time.time()) - self.ttl),
+            ).fetchone()
+        return orjson.loads(row[0]) if row else None
+
+    def put_many(self, details: Dict[int, Dict]) -> None:
+        now = int(time.time())
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO search_enrich (appid, fetched_at, json) VALUES (?, ?, ?)",
+                [(appid, now, orjson.dumps(d).decode()) for appid, d in details.items()],
+            )
+            self._conn.commit()
+
+
 @dataclass
 class SearchItem:
     appid: str
@@ -92,16 +191,76 @@ class SearchItem:
     tags_shown: List[str]
 
 
+@dataclass(slots=True)
+class Row:
+    """一条导出记录；字段顺序与 FIELDS 一致，enrich 字段默认为空。"""
+    name: str
+    steam_appid: str
+    steam_url: str
+    release_date: str
+    coming_soon: bool
+    tags_shown: Optional[str]
+    tag_category: str
+    developers: Optional[str] = None
+    publishers: Optional[str] = None
+    genres: Optional[str] = None
+    categories: Optional[str] = None
+    description: Optional[str] = None
+    supported_languages: Optional[str] = None
+    website: Optional[str] = None
+    discovery_date: str = ""
+
+
+# 按 FIELDS 顺序一次取出一行的所有值
+_ROW_VALUES = attrgetter(*FIELDS)
+
+
+class SearchPageCache(_SqliteCache):
+    """搜索分页缓存：(start, count) -> 校验头、total_count 与已解析的条目。"""
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS search_pages ("
+        "start INTEGER, count INTEGER, etag TEXT, last_modified TEXT, total_count INTEGER, items_json TEXT, "
+        "PRIMARY KEY (start, count))"
+    )
+
+    def get(self, start: int, count: int) -> Optional[Tuple[Dict[str, str], int, List[SearchItem]]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, total_count, items_json FROM search_pages WHERE start=? AND count=?",
+                (start, count),
+            ).fetchone()
+        if not row:
+            return None
+        etag, last_modified, total_count, items_json = row
+        validators: Dict[str, str] = {}
+        if etag:
+            validators["If-None-Match"] = etag
+        if last_modified:
+            validators["If-Modified-Since"] = last_modified
+        return validators, total_count, [SearchItem(**d) for d in orjson.loads(items_json)]
+
+    def put(self, start: int, count: int, etag: Optional[str], last_modified: Optional[str],
+            total_count: int, items: List[SearchItem]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_pages (start, count, etag, last_modified, total_count, items_json) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (start, count, etag, last_modified, total_count, orjson.dumps(items).decode()),
+            )
+            self._conn.commit()
+
+
 def clean_text(text: str) -> str:
     if not text:
         return ""
-    text = html.unescape(text)
-    text = re.sub(r"\s+", " ", text)
-    return text.strip()
+    return _WS_RE.sub(" ", html.unescape(text)).strip()
 
 
-def fetch_search_page(start: int, count: int, delay: float, session: requests.Session) -> Tuple[str, int]:
-    """请求搜索接口一页数据，返回 (results_html, total_count)。"""
+def fetch_search_page(start: int, count: int, delay: float, session: requests.Session,
+                      validators: Optional[Dict[str, str]] = None) -> Tuple[Optional[str], int, Dict[str, str]]:
+    """请求搜索接口一页数据，返回 (results_html, total_count, 响应的 ETag/Last-Modified)。
+    传入 validators（If-None-Match / If-Modified-Since）且服务端返回 304 时，results_html 为 None。"""
     params = {
         "query": "",              # 空查询
         "force_infinite": 1,
@@ -114,16 +273,45 @@ def fetch_search_page(start: int, count: int, delay: float, session: requests.Se
         "filter": "comingsoon",  # 仅未发布（Coming Soon）
         # 可按需添加排序："sort_by": "Price_ASC" 等
     }
+    headers = {**DEFAULT_HEADERS, **validators} if validators else DEFAULT_HEADERS
     time.sleep(delay)
-    resp = session.get(SEARCH_RESULTS_URL, params=params, headers=DEFAULT_HEADERS, timeout=20)
+    resp = session.get(SEARCH_RESULTS_URL, params=params, headers=headers, timeout=20)
     # 速率限制处理
     if resp.status_code == 429:
         logger.warning("Rate limited by search endpoint, sleeping 30s…")
         time.sleep(30)
-        resp = session.get(SEARCH_RESULTS_URL, params=params, headers=DEFAULT_HEADERS, timeout=20)
+        resp = session.get(SEARCH_RESULTS_URL, params=params, headers=headers, timeout=20)
+    if resp.status_code == 304:
+        return None, 0, {}
     resp.raise_for_status()
-    data = resp.json()
-    return data.get("results_html", ""), int(data.get("total_count", 0))
+    data = orjson.loads(resp.content)
+    new_validators = {k: resp.headers[k] for k in ("ETag", "Last-Modified") if k in resp.headers}
+    return data.get("results_html", ""), int(data.get("total_count", 0)), new_validators
+
+
+def load_search_page(start: int, count: int, delay: float, session: requests.Session,
+                     page_cache: SearchPageCache) -> Tuple[List[SearchItem], int]:
+    """带条件请求的分页读取：304 直接复用缓存中已解析的条目，200 则解析并记下新的 ETag/Last-Modified。"""
+    cached = page_cache.get(start, count)
+    validators = cached[0] if cached and cached[0] else None
+    results_html, total_count, new_validators = fetch_search_page(start, count, delay, session, validators)
+    if results_html is None and cached:
+        return cached[2], cached[1]
+    items = parse_results_html(results_html or "")
+    if new_validators:
+        page_cache.put(start, count, new_validators.get("ETag"), new_validators.get("Last-Modified"), total_count, items)
+    return items, total_count
+
+
+def appid_from_href(href: str) -> str:
+    """从 .../app/<appid>/... 链接中取出 appid（str.find 定位，替代逐行的正则匹配）。"""
+    i = href.find("/app/")
+    if i == -1:
+        return ""
+    rest = href[i + 5:]
+    j = rest.find("/")
+    appid = rest[:j] if j != -1 else ""
+    return appid if appid.isdecimal() else ""
 
 
 def parse_results_html(results_html: str) -> List[SearchItem]:
@@ -131,50 +319,79 @@ def parse_results_html(results_html: str) -> List[SearchItem]:
     items: List[SearchItem] = []
     if not results_html:
         return items
-    soup = BeautifulSoup(results_html, "lxml")
-    for a in soup.select("a.search_result_row"):
-        appid = a.get("data-ds-appid") or ""
+    tree = LexborHTMLParser(results_html)
+    for a in tree.css("a.search_result_row"):
+        attrs = a.attributes
+        appid = attrs.get("data-ds-appid") or ""
         if not appid:
             # 可能是 bundle/dlc
-            ds_packageid = a.get("data-ds-packageid")
+            ds_packageid = attrs.get("data-ds-packageid")
             if ds_packageid:
                 continue
             # 尝试从 href 提取
-            href = a.get("href", "")
-            m = re.search(r"/app/(\d+)/", href)
-            if m:
-                appid = m.group(1)
+            href = attrs.get("href") or ""
+            appid = appid_from_href(href)
         if not appid:
             continue
-        name_el = a.select_one("span.title")
-        name = clean_text(name_el.text) if name_el else ""
-        href = a.get("href", "").split("?")[0]
+        name_el = a.css_first("span.title")
+        name = clean_text(name_el.text()) if name_el else ""
+        href = (attrs.get("href") or "").split("?")[0]
         # 发售信息（文本）
-        rd_el = a.select_one("div.search_released")
-        release_date_text = clean_text(rd_el.text) if rd_el else ""
+        rd_el = a.css_first("div.search_released")
+        release_date_text = clean_text(rd_el.text()) if rd_el else ""
         # 展示标签（有限个）
-        tags_el = a.select("div.search_tags span")
-        tags_shown = [clean_text(t.text) for t in tags_el if clean_text(t.text)]
+        tags_shown = [t for t in (clean_text(el.text()) for el in a.css("div.search_tags span")) if t]
         items.append(SearchItem(appid=appid, name=name, url=href, release_date_text=release_date_text, tags_shown=tags_shown))
     return items
 
 
-def match_category(tags_shown: List[str], category: str) -> bool:
-    if not tags_shown:
-        return False
-    targets = TAG_CATEGORIES.get(category, [])
-    tags_lower = [t.lower() for t in tags_shown]
-    for target in targets:
-        tl = target.lower()
-        if any(tl in tag or tag in tl for tag in tags_lower):
-            return True
-    return False
+def match_categories(shown_lc: FrozenSet[str], categories: List[str]) -> List[str]:
+    """返回条目命中的分类（保持 categories 顺序）。shown_lc 为条目展示标签的小写集合，每个条目只计算一次。"""
+    if not shown_lc:
+        return []
+    # 展示标签本身不含换行，拼接后不会产生跨标签的误匹配
+    haystack = "\n".join(shown_lc)
+    matched = []
+    for cat in categories:
+        # 绝大多数命中是标签完全相同，先走 O(1) 集合交集；再看目标标签是否包含在展示标签中
+        # （如 "Online Co-Op" 命中 "co-op"；反方向的“展示标签是目标的子串”会误命中过短的标签，不再使用）
+        if shown_lc & TAG_CATEGORIES_LOWER[cat] or _CATEGORY_RES[cat].search(haystack):
+            matched.append(cat)
+    return matched
+
+
+def _extract_enrich_fields(d: Dict) -> Dict:
+    """从 appdetails 的 data 中仅提取需要的字段。"""
+    developers = ";".join(d.get("developers", []) or []) or None
+    publishers = ";".join(d.get("publishers", []) or []) or None
+    genres = ";".join([g.get("description", "") for g in (d.get("genres", []) or []) if g.get("description")]) or None
+    categories = ";".join([c.get("description", "") for c in (d.get("categories", []) or []) if c.get("description")]) or None
+    desc = d.get("short_description") or ""
+    desc = clean_text(desc)
+    langs = d.get("supported_languages") or ""
+    if langs:
+        # 粗略提取语言名（去掉 HTML）
+        langs = clean_text(_TAG_RE.sub(" ", langs))
+    website = d.get("website") or None
+    # coming_soon 由搜索接口已过滤，这里不再决定逻辑，仅回填更标准的日期
+    release_date = d.get("release_date", {})
+    release_text = release_date.get("date") or None
+    return {
+        "developers": developers,
+        "publishers": publishers,
+        "genres": genres,
+        "categories": categories,
+        "description": desc or None,
+        "supported_languages": langs or None,
+        "website": website,
+        "release_date_enriched": release_text,
+    }
 
 
-def enrich_appdetails(appid: int, session: requests.Session, delay: float) -> Dict:
-    """有限制地补充详情，避免被限流。"""
-    url = f"https://store.steampowered.com/api/appdetails?appids={appid}&cc=us&l=en"
-    time.sleep(delay)
+def enrich_appdetails(appid: int, session: requests.Session) -> Dict:
+    """有限制地补充详情（走全局令牌桶限速），避免被限流。"""
+    url = f"{APPDETAILS_URL}?appids={appid}&cc=us&l=en&filters={APPDETAILS_FILTERS}"
+    ENRICH_BUCKET.acquire()
     try:
         resp = session.get(url, headers=DEFAULT_HEADERS, timeout=20)
         if resp.status_code == 429:
@@ -183,155 +400,188 @@ def enrich_appdetails(appid: int, session: requests.Session, delay: float) -> Di
         if resp.status_code == 403:
             return {}
         resp.raise_for_status()
-        data = resp.json().get(str(appid), {})
+        data = orjson.loads(resp.content).get(str(appid), {})
         if not data.get("success"):
             return {}
-        d = data.get("data", {}) or {}
-        # 仅提取需要的字段
-        developers = ";".join(d.get("developers", []) or []) or None
-        publishers = ";".join(d.get("publishers", []) or []) or None
-        genres = ";".join([g.get("description", "") for g in (d.get("genres", []) or []) if g.get("description")]) or None
-        categories = ";".join([c.get("description", "") for c in (d.get("categories", []) or []) if c.get("description")]) or None
-        desc = d.get("short_description") or ""
-        desc = clean_text(desc)
-        langs = d.get("supported_languages") or ""
-        if langs:
-            # 粗略提取语言名（去掉 HTML）
-            langs = clean_text(re.sub(r"<[^>]+>", " ", langs))
-        website = d.get("website") or None
-        # coming_soon 由搜索接口已过滤，这里不再决定逻辑，仅回填更标准的日期
-        release_date = d.get("release_date", {})
-        release_text = release_date.get("date") or None
-        return {
-            "developers": developers,
-            "publishers": publishers,
-            "genres": genres,
-            "categories": categories,
-            "description": desc or None,
-            "supported_languages": langs or None,
-            "website": website,
-            "release_date_enriched": release_text,
-        }
+        return _extract_enrich_fields(data.get("data", {}) or {})
     except Exception:
         return {}
 
 
-def export_csv(rows: List[Dict], category: str) -> Path:
+def enrich_appdetails_batch(appids: List[int], session: requests.Session) -> Dict[int, Dict]:
+    """一次请求补充多个 app 的详情（appids=1,2,3），返回 {appid: 字段}。
+    接口拒绝批量（非 200 或返回 null）或缺少某个 appid 时，对这些 app 回退到单个请求。"""
+    if len(appids) == 1 or _BATCH_UNSUPPORTED.is_set():
+        return {a: enrich_appdetails(a, session) for a in appids}
+    url = f"{APPDETAILS_URL}?appids={','.join(map(str, appids))}&cc=us&l=en&filters={APPDETAILS_FILTERS}"
+    ENRICH_BUCKET.acquire()
+    data = None
+    try:
+        resp = session.get(url, headers=DEFAULT_HEADERS, timeout=30)
+        if resp.status_code == 429:
+            time.sleep(5)
+            resp = session.get(url, headers=DEFAULT_HEADERS, timeout=30)
+        if resp.status_code == 200:
+            data = orjson.loads(resp.content)
+        if resp.status_code == 400 or (resp.status_code == 200 and data is None):
+            _BATCH_UNSUPPORTED.set()
+            logger.info("appdetails 不接受批量 appids，改为逐个请求")
+    except Exception:
+        data = None
+    if not isinstance(data, dict):
+        data = {}
+
+    out: Dict[int, Dict] = {}
+    for appid in appids:
+        entry = data.get(str(appid))
+        if not isinstance(entry, dict):
+            out[appid] = enrich_appdetails(appid, session)
+        elif entry.get("success"):
+            out[appid] = _extract_enrich_fields(entry.get("data", {}) or {})
+        else:
+            out[appid] = {}
+    return out
+
+
+def merge_enrich(row: Row, detail: Dict) -> None:
+    """把 enrich 得到的字段合并进搜索结果行。"""
+    row.developers = detail.get("developers")
+    row.publishers = detail.get("publishers")
+    row.genres = detail.get("genres")
+    row.categories = detail.get("categories")
+    row.description = detail.get("description")
+    row.supported_languages = detail.get("supported_languages")
+    row.website = detail.get("website")
+    # 若 enrich 获得了更准确的日期则覆盖
+    if detail.get("release_date_enriched"):
+        row.release_date = detail["release_date_enriched"]
+
+
+def export_csv(rows: List[Row], category: str) -> Path:
     today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     out_path = EXPORT_DIR / f"steam_search_{category}_unreleased_{today}.csv"
-    with out_path.open("w", encoding="utf-8-sig", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=FIELDS)
-        writer.writeheader()
-        for r in rows:
-            writer.writerow(r)
+    with out_path.open("w", encoding="utf-8-sig", newline="", buffering=1 << 20) as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        writer.writerows(map(_ROW_VALUES, rows))
     return out_path
 
 
-def run_for_categories(categories: List[str], delay: float, page_size: int, max_pages: Optional[int], enrich: bool, max_workers: int, enrich_delay: float) -> Dict[str, List[Dict]]:
-    session = requests.Session()
-    results_by_cat: Dict[str, List[Dict]] = {}
+def run_for_categories(categories: List[str], delay: float, page_size: int, max_pages: Optional[int], enrich: bool, max_workers: int, enrich_delay: float, page_workers: int = PAGE_WORKERS) -> Dict[str, List[Row]]:
+    session = SESSION
+    configure_session(session, max(max_workers, page_workers), raise_on_status=False)
+    # 各分类的结果列表提前建好，匹配循环里直接 append，不再每次 setdefault
+    results_by_cat: Dict[str, List[Row]] = {cat: [] for cat in categories}
+    # 整个运行期间发现日期不变，只计算一次
+    discovery_date = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+    # 先获取第一页，拿 total_count（注意 total_count 可能很大）
+    page_cache = SearchPageCache(SEARCH_PAGES_CACHE)
+    items0, total_count = load_search_page(start=0, count=page_size, delay=delay, session=session, page_cache=page_cache)
+    if total_count <= 0:
+        logger.warning("搜索接口返回 total_count=0，可能被限流或页面结构变更")
+    # 从 0 开始分页
+    pages = (total_count + page_size - 1) // page_size if total_count else (max_pages or 1)
+    if max_pages is not None:
+        pages = min(pages, max_pages)
+    logger.info(f"预计抓取页数: {pages}（每页 {page_size} 条）")
+
+    # 后续页由抓取线程并发请求并解析（最多 page_workers 页同时在途），主线程按页序匹配；
+    # 已取到但未处理的页最多 PAGE_QUEUE_DEPTH 页，内存有界
+    page_exe = ThreadPoolExecutor(max_workers=max(1, page_workers))
+    window = max(1, page_workers) + PAGE_QUEUE_DEPTH
+    page_futures: Deque[Future] = deque()
+    page_starts = range(0, pages * page_size, page_size)
+    pending_starts = iter(page_starts[1:])
+
+    def submit_pages() -> None:
+        while len(page_futures) < window:
+            start = next(pending_starts, None)
+            if start is None:
+                return
+            page_futures.append(page_exe.submit(
+                load_search_page, start=start, count=page_size, delay=delay,
+                session=session, page_cache=page_cache,
+            ))
+
+    seen_appids: Set[str] = set()
+    # 首页已在上面取到，与后续页走同一条匹配流程
+    items = items0
+    for start in page_starts:
+        if start:
+            try:
+                items, _ = page_futures.popleft().result()
+            except Exception:
+                page_exe.shutdown(wait=False, cancel_futures=True)
+                raise
+        submit_pages()
+        if not items:
+            continue
 
-    try:
-        # 先获取第一页，拿 total_count（注意 total_count 可能很大）
-        html0, total_count = fetch_search_page(start=0, count=page_size, delay=delay, session=session)
-        if total_count <= 0:
-            logger.warning("搜索接口返回 total_count=0，可能被限流或页面结构变更")
-        # 从 0 开始分页
-        pages = (total_count + page_size - 1) // page_size if total_count else (max_pages or 1)
-        if max_pages is not None:
-            pages = min(pages, max_pages)
-        logger.info(f"预计抓取页数: {pages}（每页 {page_size} 条）")
-
-        # 预处理首页
-        page_items = parse_results_html(html0)
-        all_pages_cache = {0: page_items}
-
-        # 逐页抓取
-        for page_idx in range(pages):
-            start = page_idx * page_size
-            if page_idx == 0:
-                items = all_pages_cache[0]
-            else:
-                html, _ = fetch_search_page(start=start, count=page_size, delay=delay, session=session)
-                items = parse_results_html(html)
-            if not items:
+        for it in items:
+            # 同一 app 可能多页出现（分页不稳定），匹配前按 appid 去重
+            if it.appid in seen_appids:
                 continue
-
-            for cat in categories:
-                matched: List[Dict] = results_by_cat.setdefault(cat, [])
-                for it in items:
-                    if match_category(it.tags_shown, cat):
-                        matched.append({
-                            "name": it.name,
-                            "steam_appid": it.appid,
-                            "steam_url": it.url,
-                            "release_date": it.release_date_text,
-                            "coming_soon": True,
-                            "tags_shown": ";".join(it.tags_shown) if it.tags_shown else None,
-                            "tag_category": cat,
-                            "developers": None,
-                            "publishers": None,
-                            "genres": None,
-                            "categories": None,
-                            "description": None,
-                            "supported_languages": None,
-                            "website": None,
-                            "discovery_date": datetime.now(timezone.utc).strftime("%Y-%m-%d"),
-                        })
-
-        # 去重（同一 app 可能多页出现）
-        for cat in categories:
-            seen: Set[str] = set()
-            deduped: List[Dict] = []
-            for r in results_by_cat.get(cat, []):
-                if r["steam_appid"] in seen:
-                    continue
-                seen.add(r["steam_appid"])
-                deduped.append(r)
-            results_by_cat[cat] = deduped
-            logger.info(f"{cat}: 页面级匹配 {len(deduped)} 个候选")
-
-        # 可选 enrich（有限并发 + 延时）
-        if enrich:
+            seen_appids.add(it.appid)
+            shown_lc = frozenset(t.lower() for t in it.tags_shown)
+            for cat in match_categories(shown_lc, categories):
+                results_by_cat[cat].append(Row(
+                    name=it.name,
+                    steam_appid=it.appid,
+                    steam_url=it.url,
+                    release_date=it.release_date_text,
+                    coming_soon=True,
+                    tags_shown=";".join(it.tags_shown) if it.tags_shown else None,
+                    tag_category=cat,
+                    discovery_date=discovery_date,
+                ))
+
+    page_exe.shutdown()
+    page_cache.close()
+
+    for cat in categories:
+        logger.info(f"{cat}: 页面级匹配 {len(results_by_cat.get(cat, []))} 个候选")
+
+    # 可选 enrich：先查本地缓存，未命中的批量请求；--enrich-delay 仍按“每线程间隔”理解，换算成 ENRICH_BUCKET 的总速率
+    if enrich:
+        ENRICH_BUCKET.configure(rate=max_workers / enrich_delay if enrich_delay > 0 else 0, capacity=max_workers)
+        cache = EnrichCache(DETAILS_CACHE)
+        try:
             for cat in categories:
                 rows = results_by_cat.get(cat, [])
                 if not rows:
                     continue
-                logger.info(f"{cat}: 开始补充详情（{len(rows)} 个）…")
-                def task(row: Dict) -> Tuple[str, Dict]:
-                    a = int(row["steam_appid"])
-                    d = enrich_appdetails(a, session, enrich_delay)
-                    return row["steam_appid"], d
+                missing: List[Row] = []
+                for row in rows:
+                    detail = cache.get(int(row.steam_appid))
+                    if detail is None:
+                        missing.append(row)
+                    else:
+                        merge_enrich(row, detail)
+                logger.info(f"{cat}: 开始补充详情（{len(rows)} 个，缓存命中 {len(rows) - len(missing)} 个）…")
+                def task(chunk: List[Row]) -> Dict[int, Dict]:
+                    return enrich_appdetails_batch([int(r.steam_appid) for r in chunk], session)
+                chunks = [missing[i:i + ENRICH_BATCH_SIZE] for i in range(0, len(missing), ENRICH_BATCH_SIZE)]
                 with ThreadPoolExecutor(max_workers=max_workers) as exe:
-                    futures = {exe.submit(task, row): row for row in rows}
+                    futures = {exe.submit(task, chunk): chunk for chunk in chunks}
                     for fut in as_completed(futures):
-                        row = futures[fut]
                         try:
-                            _, detail = fut.result()
-                            if detail:
-                                # 合并字段
-                                row.update({
-                                    "developers": detail.get("developers"),
-                                    "publishers": detail.get("publishers"),
-                                    "genres": detail.get("genres"),
-                                    "categories": detail.get("categories"),
-                                    "description": detail.get("description"),
-                                    "supported_languages": detail.get("supported_languages"),
-                                    "website": detail.get("website"),
-                                })
-                                # 若 enrich 获得了更准确的日期则覆盖
-                                if detail.get("release_date_enriched"):
-                                    row["release_date"] = detail["release_date_enriched"]
+                            details = fut.result()
                         except Exception:
-                            pass
-
-        # 导出 CSV
-        for cat in categories:
-            out = export_csv(results_by_cat.get(cat, []), cat)
-            logger.info(f"导出 {cat}: {out}")
+                            continue
+                        # 只缓存成功拿到的详情，失败的下次运行再试
+                        cache.put_many({a: d for a, d in details.items() if d})
+                        for row in futures[fut]:
+                            detail = details.get(int(row.steam_appid))
+                            if detail:
+                                merge_enrich(row, detail)
+        finally:
+            cache.close()
 
-    finally:
-        session.close()
+    # 导出 CSV
+    for cat in categories:
+        out = export_csv(results_by_cat.get(cat, []), cat)
+        logger.info(f"导出 {cat}: {out}")
 
     return results_by_cat
 
@@ -348,9 +598,10 @@ def main():
     parser.add_argument("--delay", type=float, default=0.75, help="每页请求的基础延时（秒）")
     parser.add_argument("--page-size", type=int, default=50, help="每页数量，建议 50")
     parser.add_argument("--max-pages", type=int, help="最多抓取的页数（不填则抓取全部页）")
+    parser.add_argument("--page-workers", type=int, default=PAGE_WORKERS, help="搜索分页的并发请求数（建议 2-6）")
     parser.add_argument("--no-enrich", action="store_true", help="不补充 appdetails 详情，速度更快")
     parser.add_argument("--max-workers", type=int, default=4, help="enrich 阶段的并发度（建议 2-6）")
-    parser.add_argument("--enrich-delay", type=float, default=0.5, help="单个 appdetails 请求之间的延时（秒）")
+    parser.add_argument("--enrich-delay", type=float, default=0.5, help="每个 enrich 线程的 appdetails 请求间隔（秒），全局速率 = max-workers / enrich-delay")
 
     args = parser.parse_args()
 
@@ -367,6 +618,7 @@ def main():
         enrich=enrich,
         max_workers=args.max_workers,
         enrich_delay=args.enrich_delay,
+        page_workers=args.page_workers,
     )
 
     logger.info("完成！")
@@ -14,16 +14,35 @@ import time
 import html
 import re
 import argparse
+from operator import itemgetter
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import List, Dict, Set, Optional
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Constants
 APPLIST_URL = "https://api.steampowered.com/ISteamApps/GetAppList/v2/"
 DETAILS_URL_TEMPLATE = "https://store.steampowered.com/api/appdetails?appids={appid}&cc=us&l=en"
 
+# Browser-like headers shared by every request
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'application/json, text/plain, */*',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Connection': 'keep-alive',
+}
+
+# Connection pool size (requests are sequential, keep a little headroom)
+POOL_SIZE = 4
+
+# Precompiled patterns used for every cleaned field
+_TAG_RE = re.compile(r'<[^>]+>')
+_WS_RE = re.compile(r'\s+')
+_LANG_RE = re.compile(r'>([^<]+)<')
+
 # 分别定义每种标签类型
 TAG_CATEGORIES = {
     "narrative": {
@@ -64,6 +83,9 @@ FIELDS = [
     "discovery_date"
 ]
 
+# Pull one row's values in FIELDS order
+_ROW_VALUES = itemgetter(*FIELDS)
+
 # Setup directories
 DATA_DIR = Path(__file__).parent / "steam_data"
 EXPORT_DIR = Path(__file__).parent / "exports"
@@ -81,34 +103,44 @@ logging.basicConfig(
 )
 logger = logging.getLogger("steam_tag_specific")
 
+# Shared session: one keep-alive connection pool for the applist and every appdetails call,
+# with 5xx/429 retried inside the adapter (the final response is handed back to the caller)
+SESSION = requests.Session()
+SESSION.headers.update(DEFAULT_HEADERS)
+_adapter = HTTPAdapter(
+    pool_connections=POOL_SIZE,
+    pool_maxsize=POOL_SIZE * 2,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        respect_retry_after_header=True,
+        allowed_methods=["GET"],
+        raise_on_status=False,
+    ),
+)
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
+
 def fetch_full_applist() -> List[Dict]:
     """Download the full Steam app list."""
     logger.info("获取Steam应用列表...")
-    resp = requests.get(APPLIST_URL, timeout=30)
+    resp = SESSION.get(APPLIST_URL, timeout=30)
     resp.raise_for_status()
     data = resp.json()
     apps = data.get("applist", {}).get("apps", [])
     logger.info(f"找到 {len(apps)} 个应用")
     return apps
 
-def fetch_app_details(appid: int, session: requests.Session = None) -> Optional[Dict]:
+def fetch_app_details(appid: int, session: requests.Session) -> Optional[Dict]:
     """Fetch detailed information for a specific app with improved error handling."""
-    sess = session or requests.Session()
-    
-    # Set browser-like headers
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'application/json, text/plain, */*',
-        'Accept-Language': 'en-US,en;q=0.9',
-    }
-    
     url = DETAILS_URL_TEMPLATE.format(appid=appid)
     
     try:
         # Add delay to be respectful
         time.sleep(1.5)
         
-        resp = sess.get(url, headers=headers, timeout=15)
+        resp = session.get(url, timeout=15)
         
         # Skip forbidden apps (they might be region-locked or private)
         if resp.status_code == 403:
@@ -140,10 +172,8 @@ def clean_text_content(text: str) -> str:
     if not text:
         return ""
     
-    text = html.unescape(text)
-    text = re.sub(r'<[^>]+>', '', text)
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
+    text = _TAG_RE.sub('', html.unescape(text))
+    return _WS_RE.sub(' ', text).strip()
 
 def extract_tags_from_details(details: Dict) -> List[str]:
     """Extract all available tags/categories from game details."""
@@ -205,7 +235,7 @@ def is_unreleased_game(details: Dict) -> bool:
     
     return True
 
-def process_app_for_category(appid: int, session: requests.Session, target_category: str) -> Optional[Dict]:
+def process_app_for_category(appid: int, session: requests.Session, target_category: str, discovery_date: str) -> Optional[Dict]:
     """Process a single app for a specific tag category."""
     details = fetch_app_details(appid, session)
     
@@ -237,17 +267,17 @@ def process_app_for_category(appid: int, session: requests.Session, target_categ
     supported_languages = []
     if details.get('supported_languages'):
         lang_text = details.get('supported_languages', '')
-        languages = re.findall(r'>([^<]+)<', lang_text)
+        languages = _LANG_RE.findall(lang_text)
         if not languages:
             languages = [lang.strip() for lang in lang_text.split(',')]
         supported_languages = [lang.strip() for lang in languages if lang.strip()]
     
     return {
-        "name": details.get('name', ''),
+        "name": clean_text_content(details.get('name', '')),
         "steam_appid": str(appid),
         "steam_url": f"https://store.steampowered.com/app/{appid}/",
-        "developers": ";".join(details.get('developers', [])) if details.get('developers') else None,
-        "publishers": ";".join(details.get('publishers', [])) if details.get('publishers') else None,
+        "developers": clean_text_content(";".join(details.get('developers', []))) if details.get('developers') else None,
+        "publishers": clean_text_content(";".join(details.get('publishers', []))) if details.get('publishers') else None,
         "categories": ";".join([cat.get('description', '') for cat in details.get('categories', [])]) if details.get('categories') else None,
         "genres": ";".join([genre.get('description', '') for genre in details.get('genres', [])]) if details.get('genres') else None,
         "tags": ";".join(available_tags) if available_tags else None,
@@ -258,13 +288,15 @@ def process_app_for_category(appid: int, session: requests.Session, target_categ
         "website": details.get('website'),
         "target_tags_found": ";".join(found_target_tags),
         "tag_category": target_category,
-        "discovery_date": datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        "discovery_date": discovery_date
     }
 
 def search_category(app_batch: List[int], target_category: str, max_finds: int = 1) -> List[Dict]:
     """Search for games in a specific category."""
     results = []
-    session = requests.Session()
+    session = SESSION
+    # Discovery date is constant for the whole search, compute it once
+    discovery_date = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     
     category_info = TAG_CATEGORIES[target_category]
     logger.info(f"正在搜索 {category_info['description']} 类游戏...")
@@ -276,7 +308,7 @@ def search_category(app_batch: List[int], target_category: str, max_finds: int =
             break
             
         try:
-            result = process_app_for_category(appid, session, target_category)
+            result = process_app_for_category(appid, session, target_category, discovery_date)
             if result:
                 results.append(result)
                 logger.info(f"✓ 找到 {category_info['description']}: {result['name']} (标签: {result['target_tags_found']})")
@@ -291,28 +323,17 @@ def search_category(app_batch: List[int], target_category: str, max_finds: int =
         if (i + 1) % 100 == 0:
             logger.info(f"  {category_info['description']} 搜索进度: {i + 1}/{len(app_batch)}，已找到 {len(results)} 个")
     
-    session.close()
     return results
 
 def export_category_results(results: List[Dict], category: str) -> Path:
-    """Export results for a specific category."""
+    """Export results for a specific category (rows are already cleaned in process_app_for_category)."""
     today_str = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     file_path = EXPORT_DIR / f"steam_{category}_games_{today_str}.csv"
     
-    with file_path.open("w", encoding="utf-8-sig", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=FIELDS)
-        writer.writeheader()
-        for row in results:
-            cleaned_row = {}
-            for key, value in row.items():
-                if isinstance(value, str) and value:
-                    if key in ['name', 'description', 'developers', 'publishers']:
-                        cleaned_row[key] = clean_text_content(value)
-                    else:
-                        cleaned_row[key] = value
-                else:
-                    cleaned_row[key] = value
-            writer.writerow(cleaned_row)
+    with file_path.open("w", encoding="utf-8-sig", newline="", buffering=1 << 20) as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        writer.writerows(map(_ROW_VALUES, results))
     
     return file_path
 
@@ -1,22 +1,55 @@
 import os
 import json
+import orjson
 import csv
 import requests
 import logging
 import time
 import html
 import re
+import sqlite3
+import threading
+from functools import lru_cache
+from operator import itemgetter
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import List, Dict, Set, Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Set, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from dotenv import load_dotenv
+from dateutil import parser as dateparser
+from requests.adapters import HTTPAdapter
+from steam_http import TokenBucket
 
 # Constants
 APPLIST_URL = "https://api.steampowered.com/ISteamApps/GetAppList/v2/"
 DETAILS_URL_TEMPLATE = "https://store.steampowered.com/api/appdetails?appids={appid}&cc=us&l=en"
+# Cheap pre-filter: only type/name/release status, many appids per request
+BASIC_BATCH_URL_TEMPLATE = "https://store.steampowered.com/api/appdetails?appids={appids}&filters=basic,release_date&cc=us&l=en"
+BASIC_BATCH_SIZE = 20
 SEARCH_URL = "https://store.steampowered.com/search/results"
 
+# Browser-like headers to avoid blocking (set once on the shared session)
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'application/json, text/plain, */*',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'DNT': '1',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+}
+
+# Precompiled patterns for text cleaning
+_TAG_RE = re.compile(r'<[^>]+>')
+_WS_RE = re.compile(r'\s+')
+_LANG_RE = re.compile(r'>([^<]+)<')
+
+# Descriptions keep DESCRIPTION_MAX_CHARS cleaned chars; the raw HTML is cleaned in windows starting at
+# DESCRIPTION_RAW_WINDOW chars and widened until enough text (plus a margin past the cut) comes out
+DESCRIPTION_MAX_CHARS = 300
+DESCRIPTION_RAW_WINDOW = 2000
+_DESCRIPTION_CUT_MARGIN = 50
+
 # Target tags for searching
 TARGET_TAGS = {
     "co-op": ["Co-op", "Local Co-Op", "Online Co-Op", "Cooperative"],
@@ -29,6 +62,9 @@ ALL_TARGET_TAGS = []
 for tag_group in TARGET_TAGS.values():
     ALL_TARGET_TAGS.extend(tag_group)
 
+# Deduplicated (tag, lowercase tag) pairs in ALL_TARGET_TAGS order, computed once for matching
+_TARGET_TAGS_LOWER = [(tag, tag.lower()) for tag in dict.fromkeys(ALL_TARGET_TAGS)]
+
 # Output fields
 FIELDS = [
     "name",
@@ -48,6 +84,9 @@ FIELDS = [
     "discovery_date"
 ]
 
+# Pulls a result dict's values out in FIELDS order for csv.writer
+_ROW_VALUES = itemgetter(*FIELDS)
+
 # Setup directories
 DATA_DIR = Path(__file__).parent / "steam_data"
 EXPORT_DIR = Path(__file__).parent / "exports"
@@ -67,48 +106,138 @@ logger = logging.getLogger("steam_unreleased_tags")
 
 MAX_WORKERS = int(os.environ.get("MAX_WORKERS", "4"))  # Very conservative to avoid rate limiting
 
+# Global request budget for appdetails (~200 requests per 5 minutes per IP)
+REQUESTS_PER_SECOND = float(os.environ.get("REQUESTS_PER_SECOND", "0.7"))
+
+BUCKET = TokenBucket(rate=REQUESTS_PER_SECOND)
+
+def _retry_after_seconds(resp: requests.Response) -> Optional[float]:
+    """Seconds from a numeric Retry-After header, if the server sent one."""
+    value = resp.headers.get("Retry-After", "")
+    return float(value) if value.isdigit() else None
+
+# One keep-alive connection pool shared by every batch and worker thread;
+# retries stay in fetch_app_details so the 429 handling there is unchanged
+SESSION = requests.Session()
+SESSION.headers.update(DEFAULT_HEADERS)
+_adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS * 2, max_retries=0)
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
+
+# On-disk appdetails cache shared across runs. Unreleased games are re-fetched after a day,
+# released games never change the outcome (is_unreleased_game rejects them) so they are kept,
+# and appids Steam reports as success=false are retried only after a week.
+DETAILS_CACHE = DATA_DIR / "appdetails_cache.sqlite"
+UNRELEASED_CACHE_TTL = 86400
+NEGATIVE_CACHE_TTL = 7 * 86400
+
+_cache_lock = threading.Lock()
+_cache_conn: Optional[sqlite3.Connection] = None
+
+def _get_cache_conn() -> sqlite3.Connection:
+    """Open the details cache once per process; the connection is shared by all worker threads."""
+    global _cache_conn
+    if _cache_conn is None:
+        conn = sqlite3.connect(str(DETAILS_CACHE), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(unreleased_details)")}
+        if "is_game" in columns:
+            # Old layout kept the full payload for every rejected app; it is only a cache, so rebuild it
+            conn.execute("DROP TABLE unreleased_details")
+            conn.commit()
+            conn.execute("VACUUM")
+        # json holds the full payload only for unreleased games; rejected apps are a marker row (json NULL, rejected=1)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS unreleased_details ("
+            "appid INTEGER PRIMARY KEY, fetched_at INTEGER, json TEXT, rejected INTEGER, coming_soon INTEGER)"
+        )
+        conn.commit()
+        _cache_conn = conn
+    return _cache_conn
+
+def get_cached_details(appid: int) -> Tuple[bool, Optional[Dict]]:
+    """Return (hit, details). A hit with details=None is a cached success=false response or a rejected app."""
+    with _cache_lock:
+        row = _get_cache_conn().execute(
+            "SELECT json, fetched_at, rejected, coming_soon FROM unreleased_details WHERE appid=?", (appid,)
+        ).fetchone()
+    if not row:
+        return False, None
+    raw, fetched_at, rejected, coming_soon = row
+    age = time.time() - fetched_at
+    if coming_soon and age >= UNRELEASED_CACHE_TTL:
+        return False, None
+    if rejected:
+        # Released apps and non-games stay rejected; only the unclear-status ones above expire
+        return True, None
+    if raw is None:
+        return (True, None) if age < NEGATIVE_CACHE_TTL else (False, None)
+    return True, orjson.loads(raw)
+
+def put_cached_details(appid: int, details: Optional[Dict]) -> None:
+    """Store a details payload (or None for success=false) for later runs.
+
+    Only unreleased games keep their payload; anything is_unreleased_game rejects is stored as a
+    marker row, since the details are never needed again.
+    """
+    if details is None:
+        values = (appid, int(time.time()), None, 0, 0)
+    else:
+        coming_soon = (details.get('release_date') or {}).get('coming_soon')
+        rejected = not is_unreleased_game(details)
+        values = (
+            appid,
+            int(time.time()),
+            None if rejected else orjson.dumps(details).decode(),
+            int(rejected),
+            # Unknown release status is treated like coming soon so it expires with the short TTL
+            int(coming_soon is not False),
+        )
+    with _cache_lock:
+        conn = _get_cache_conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO unreleased_details (appid, fetched_at, json, rejected, coming_soon) "
+            "VALUES (?, ?, ?, ?, ?)",
+            values,
+        )
+        conn.commit()
+
 def fetch_full_applist() -> List[Dict]:
     """Download the full Steam app list."""
     logger.info("Fetching Steam app list...")
-    resp = requests.get(APPLIST_URL, timeout=30)
+    resp = SESSION.get(APPLIST_URL, timeout=30)
     resp.raise_for_status()
-    data = resp.json()
+    data = orjson.loads(resp.content)
     apps = data.get("applist", {}).get("apps", [])
     logger.info(f"Found {len(apps)} apps in Steam database")
     return apps
 
 def fetch_app_details(appid: int, session: requests.Session = None) -> Optional[Dict]:
-    """Fetch detailed information for a specific app with retry mechanism."""
-    sess = session or requests.Session()
-    
-    # Set browser-like headers to avoid blocking
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'application/json, text/plain, */*',
-        'Accept-Language': 'en-US,en;q=0.9',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'DNT': '1',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-    }
+    """Fetch detailed information for a specific app with retry mechanism (served from the disk cache when fresh)."""
+    hit, cached = get_cached_details(appid)
+    if hit:
+        return cached
+    
+    sess = session or SESSION
     
     url = DETAILS_URL_TEMPLATE.format(appid=appid)
     
     max_retries = 3
-    base_delay = 1.0  # Increased base delay
     
     for attempt in range(max_retries):
         try:
-            # Progressive delay: 1s, 2s, 4s for retries
-            delay = base_delay * (2 ** attempt)
-            time.sleep(delay)
+            # Pace through the shared bucket instead of sleeping before every request
+            BUCKET.acquire()
             
-            resp = sess.get(url, headers=headers, timeout=15)
+            resp = sess.get(url, timeout=15)
             
             # Handle rate limiting specifically
             if resp.status_code == 429:
+                BUCKET.on_rate_limited()
                 if attempt < max_retries - 1:
-                    wait_time = 30 * (attempt + 1)  # Wait 30s, 60s, 90s
+                    # Honor Retry-After, otherwise wait 30s, 60s
+                    wait_time = _retry_after_seconds(resp) or 30 * (attempt + 1)
                     logger.warning(f"Rate limited for app {appid}, waiting {wait_time}s before retry {attempt + 1}")
                     time.sleep(wait_time)
                     continue
@@ -117,13 +246,18 @@ def fetch_app_details(appid: int, session: requests.Session = None) -> Optional[
                     return None
             
             resp.raise_for_status()
-            data = resp.json().get(str(appid), {})
+            BUCKET.on_success()
+            data = orjson.loads(resp.content).get(str(appid), {})
             
             if not data.get("success"):
+                put_cached_details(appid, None)
                 return None
             
             details = data.get("data", {})
-            return details if details else None
+            if not details:
+                return None
+            put_cached_details(appid, details)
+            return details
             
         except requests.exceptions.RequestException as e:
             if attempt < max_retries - 1:
@@ -139,21 +273,109 @@ def fetch_app_details(appid: int, session: requests.Session = None) -> Optional[
     
     return None
 
+# Set once Steam refuses a multi-appid request, so the rest of the run skips the pre-filter
+_basic_batch_unsupported = threading.Event()
+
+def fetch_basic_batch(appids: List[int], session: requests.Session = None) -> Dict[int, Optional[Dict]]:
+    """Fetch basic+release_date data for up to BASIC_BATCH_SIZE apps in one request.
+
+    Returns {appid: data} for resolved apps and {appid: None} for success=false.
+    Apps missing from the result (rate limited, errors, batch refused) are unknown.
+    """
+    if _basic_batch_unsupported.is_set():
+        return {}
+    sess = session or SESSION
+    url = BASIC_BATCH_URL_TEMPLATE.format(appids=",".join(map(str, appids)))
+    try:
+        BUCKET.acquire()
+        resp = sess.get(url, timeout=15)
+        if resp.status_code == 429:
+            BUCKET.on_rate_limited()
+            return {}
+        if resp.status_code == 400:
+            _basic_batch_unsupported.set()
+            logger.info("appdetails refused a multi-appid request, skipping the basic pre-filter")
+            return {}
+        resp.raise_for_status()
+        data = orjson.loads(resp.content)
+    except Exception as e:
+        logger.warning(f"Basic batch request failed for {len(appids)} apps: {e}")
+        return {}
+    if not isinstance(data, dict):
+        _basic_batch_unsupported.set()
+        logger.info("appdetails refused a multi-appid request, skipping the basic pre-filter")
+        return {}
+    
+    BUCKET.on_success()
+    result: Dict[int, Optional[Dict]] = {}
+    for appid in appids:
+        entry = data.get(str(appid))
+        if not isinstance(entry, dict):
+            continue
+        result[appid] = (entry.get("data") or None) if entry.get("success") else None
+    return result
+
+def prefilter_unreleased(appids: List[int], session: requests.Session = None) -> List[int]:
+    """Drop apps that the disk cache or the basic batch pass show are not unreleased games.
+
+    Apps the batch pass could not resolve are kept, so the full fetch in
+    process_app still decides for them.
+    """
+    keep: List[int] = []
+    unknown: List[int] = []
+    for appid in appids:
+        hit, cached = get_cached_details(appid)
+        if not hit:
+            unknown.append(appid)
+        elif cached is not None and is_unreleased_game(cached):
+            keep.append(appid)
+    
+    for i in range(0, len(unknown), BASIC_BATCH_SIZE):
+        chunk = unknown[i:i + BASIC_BATCH_SIZE]
+        basic = fetch_basic_batch(chunk, session)
+        for appid in chunk:
+            if appid not in basic:
+                keep.append(appid)
+                continue
+            data = basic[appid]
+            if data is not None and is_unreleased_game(data):
+                keep.append(appid)
+            else:
+                # Rejected on type/release status alone; cache it so later runs skip it too
+                put_cached_details(appid, data)
+    return keep
+
 def clean_text_content(text: str) -> str:
     """Clean HTML content and normalize whitespace."""
     if not text:
         return ""
     
-    # Decode HTML entities
-    text = html.unescape(text)
-    
-    # Remove HTML tags
-    text = re.sub(r'<[^>]+>', '', text)
-    
-    # Normalize whitespace
-    text = re.sub(r'\s+', ' ', text).strip()
-    
-    return text
+    # Decode HTML entities, remove HTML tags, normalize whitespace
+    return _WS_RE.sub(' ', _TAG_RE.sub('', html.unescape(text))).strip()
+
+def _description_from_html(raw: str) -> str:
+    """First DESCRIPTION_MAX_CHARS cleaned chars of an HTML description, with '...' if anything was cut.
+
+    Cleans a leading window of the raw HTML instead of the whole blob. Descriptions often open with
+    a run of <img> tags, so the window doubles until it yields enough text or covers everything.
+    """
+    window = DESCRIPTION_RAW_WINDOW
+    while True:
+        raw_cut = len(raw) > window
+        chunk = raw[:window] if raw_cut else raw
+        if raw_cut:
+            # Drop a tag the cut left unterminated so it isn't kept as text
+            lt = chunk.rfind('<')
+            if lt > chunk.rfind('>'):
+                chunk = chunk[:lt]
+        clean_desc = clean_text_content(chunk)
+        # The margin keeps a half-cut entity/word at the window edge out of the kept slice
+        if not raw_cut or len(clean_desc) > DESCRIPTION_MAX_CHARS + _DESCRIPTION_CUT_MARGIN:
+            break
+        window *= 2
+    if raw_cut or len(clean_desc) > DESCRIPTION_MAX_CHARS:
+        return clean_desc[:DESCRIPTION_MAX_CHARS] + '...'
+    return clean_desc
 
 def extract_tags_from_details(details: Dict) -> List[str]:
     """Extract all available tags/categories from game details."""
@@ -178,20 +400,27 @@ def extract_tags_from_details(details: Dict) -> List[str]:
 
 def check_target_tags(available_tags: List[str]) -> List[str]:
     """Check which target tags are present in the available tags."""
-    found_tags = []
+    if not available_tags:
+        return []
     available_lower = [tag.lower() for tag in available_tags]
-    
-    for target_tag in ALL_TARGET_TAGS:
-        target_lower = target_tag.lower()
-        
-        # Check for exact matches or partial matches
-        for available_tag in available_lower:
-            if target_lower in available_tag or available_tag in target_lower:
-                if target_tag not in found_tags:
-                    found_tags.append(target_tag)
-                break
-    
-    return found_tags
+    # Tags never contain newlines, so one substring search over the joined text
+    # answers "is this target inside any available tag" without matching across tags
+    haystack = "\n".join(available_lower)
+    
+    # Check for exact matches or partial matches in either direction
+    return [
+        target_tag
+        for target_tag, target_lower in _TARGET_TAGS_LOWER
+        if target_lower in haystack or any(available_tag in target_lower for available_tag in available_lower)
+    ]
+
+@lru_cache(maxsize=4096)
+def _parse_release_date(release_date: str) -> Optional[datetime]:
+    """Parse a Steam release-date string; None if unparseable. Many apps share the same strings."""
+    try:
+        return dateparser.parse(release_date)
+    except (ValueError, OverflowError):
+        return None
 
 def is_unreleased_game(details: Dict) -> bool:
     """Check if the game is unreleased and is actually a game."""
@@ -213,21 +442,34 @@ def is_unreleased_game(details: Dict) -> bool:
     # If no clear coming_soon info, check if there's a future date
     release_date = release_info.get('date', '')
     if release_date:
-        try:
-            # Try to parse the date and see if it's in the future
-            from dateutil import parser as dateparser
-            parsed_date = dateparser.parse(release_date)
-            return parsed_date > datetime.now()
-        except:
-            pass
+        parsed_date = _parse_release_date(release_date)
+        if parsed_date is not None:
+            try:
+                # See if the parsed date is in the future
+                return parsed_date > datetime.now()
+            except TypeError:
+                pass
     
     # Default to treating as potentially unreleased if unclear
     return True
 
+def _joined(values: Optional[List], key: Optional[str] = None) -> Optional[str]:
+    """';'-join a details list (or one key of each dict in it); None when the list is empty or missing."""
+    if not values:
+        return None
+    if key is None:
+        return ";".join(values)
+    return ";".join([value.get(key, '') for value in values])
+
 def process_app(appid: int, session: requests.Session) -> Optional[Dict]:
     """Process a single app and return formatted data if it matches criteria."""
-    details = fetch_app_details(appid, session)
-    
+    return parse_and_match(appid, fetch_app_details(appid, session))
+
+def parse_and_match(appid: int, details: Optional[Dict], run_date: Optional[str] = None) -> Optional[Dict]:
+    """Turn fetched appdetails into an output row if it matches criteria. Pure CPU, no I/O.
+
+    run_date becomes the row's discovery_date (default: today, UTC).
+    """
     if not details:
         return None
     
@@ -255,58 +497,191 @@ def process_app(appid: int, session: requests.Session) -> Optional[Dict]:
     if details.get('short_description'):
         description = clean_text_content(details.get('short_description'))
     elif details.get('detailed_description'):
-        detailed_desc = details.get('detailed_description', '')
-        clean_desc = clean_text_content(detailed_desc)
-        description = clean_desc[:300] + '...' if len(clean_desc) > 300 else clean_desc
+        description = _description_from_html(details['detailed_description'])
     
     # Extract supported languages
     supported_languages = []
     if details.get('supported_languages'):
         lang_text = details.get('supported_languages', '')
-        languages = re.findall(r'>([^<]+)<', lang_text)
+        languages = _LANG_RE.findall(lang_text)
         if not languages:
             languages = [lang.strip() for lang in lang_text.split(',')]
         supported_languages = [lang.strip() for lang in languages if lang.strip()]
     
+    developers = _joined(details.get('developers'))
+    publishers = _joined(details.get('publishers'))
+    
     return {
-        "name": details.get('name', ''),
+        "name": clean_text_content(details.get('name', '')),
         "steam_appid": str(appid),
         "steam_url": f"https://store.steampowered.com/app/{appid}/",
-        "developers": ";".join(details.get('developers', [])) if details.get('developers') else None,
-        "publishers": ";".join(details.get('publishers', [])) if details.get('publishers') else None,
-        "categories": ";".join([cat.get('description', '') for cat in details.get('categories', [])]) if details.get('categories') else None,
-        "genres": ";".join([genre.get('description', '') for genre in details.get('genres', [])]) if details.get('genres') else None,
-        "tags": ";".join(available_tags) if available_tags else None,
+        "developers": clean_text_content(developers) if developers else None,
+        "publishers": clean_text_content(publishers) if publishers else None,
+        "categories": _joined(details.get('categories'), 'description'),
+        "genres": _joined(details.get('genres'), 'description'),
+        "tags": _joined(available_tags),
         "release_date": release_date,
         "coming_soon": coming_soon,
         "description": description,
-        "supported_languages": ";".join(supported_languages) if supported_languages else None,
+        "supported_languages": _joined(supported_languages),
         "website": details.get('website'),
         "target_tags_found": ";".join(found_target_tags),
-        "discovery_date": datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        "discovery_date": run_date or current_run_date()
     }
 
-def search_by_batch(app_batch: List[int], batch_num: int, total_batches: int) -> List[Dict]:
-    """Process a batch of apps."""
+# Resume support: every hit is appended to a per-day JSONL file and every resolved appid is
+# recorded in attempted.sqlite, so a restarted run on the same day skips finished work
+ATTEMPTED_DB = DATA_DIR / "attempted.sqlite"
+
+_attempted_lock = threading.Lock()
+_attempted_conn: Optional[sqlite3.Connection] = None
+_checkpoint_lock = threading.Lock()
+
+def _get_attempted_conn() -> sqlite3.Connection:
+    global _attempted_conn
+    if _attempted_conn is None:
+        conn = sqlite3.connect(str(ATTEMPTED_DB), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS attempted ("
+            "run_date TEXT, appid INTEGER, outcome TEXT, PRIMARY KEY (run_date, appid))"
+        )
+        conn.commit()
+        _attempted_conn = conn
+    return _attempted_conn
+
+def load_attempted(run_date: str) -> Set[int]:
+    """Appids already resolved by an earlier run on run_date."""
+    with _attempted_lock:
+        rows = _get_attempted_conn().execute("SELECT appid FROM attempted WHERE run_date=?", (run_date,)).fetchall()
+    return {row[0] for row in rows}
+
+def mark_attempted(run_date: str, outcomes: List[Tuple[int, str]]) -> None:
+    """Record (appid, outcome) pairs: match, no_match or rejected."""
+    if not outcomes:
+        return
+    with _attempted_lock:
+        conn = _get_attempted_conn()
+        conn.executemany(
+            "INSERT OR REPLACE INTO attempted (run_date, appid, outcome) VALUES (?, ?, ?)",
+            [(run_date, appid, outcome) for appid, outcome in outcomes],
+        )
+        conn.commit()
+
+def checkpoint_path(run_date: str) -> Path:
+    return EXPORT_DIR / f"results_{run_date}.jsonl"
+
+def append_checkpoint(run_date: str, row: Dict) -> None:
+    with _checkpoint_lock, checkpoint_path(run_date).open("a", encoding="utf-8") as f:
+        f.write(orjson.dumps(row).decode() + "\n")
+        f.flush()
+
+def current_run_date() -> str:
+    """UTC date that scopes the checkpoint file and attempted.sqlite; compute once per run."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+def load_checkpoint_results(run_date: Optional[str] = None) -> List[Dict]:
+    """All hits recorded for run_date (default: today), deduplicated by appid."""
+    run_date = run_date or current_run_date()
+    path = checkpoint_path(run_date)
+    if not path.exists():
+        return []
+    rows: Dict[str, Dict] = {}
+    with path.open("rb") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                # A run killed mid-write can leave a truncated last line
+                continue
+            rows[row["steam_appid"]] = row
+    return list(rows.values())
+
+def merge_checkpoint_results(results: List[Dict], run_date: str, appids: Optional[Set[int]] = None) -> List[Dict]:
+    """Union of this run's results and the run_date checkpoint (optionally limited to appids), one row per appid."""
+    merged: Dict[str, Dict] = {}
+    for row in load_checkpoint_results(run_date):
+        if appids is None or int(row["steam_appid"]) in appids:
+            merged[row["steam_appid"]] = row
+    for row in results:
+        merged[row["steam_appid"]] = row
+    return list(merged.values())
+
+def _fetch_details_safely(appid: int, session: requests.Session) -> Optional[Dict]:
+    try:
+        return fetch_app_details(appid, session)
+    except Exception as e:
+        logger.warning(f"Error fetching app {appid}: {e}")
+        return None
+
+def _parse_and_match_safely(appid: int, details: Optional[Dict], run_date: str) -> Optional[Dict]:
+    try:
+        return parse_and_match(appid, details, run_date)
+    except Exception as e:
+        logger.warning(f"Error processing app {appid}: {e}")
+        return None
+
+def search_by_batch(app_batch: List[int], batch_num: int, total_batches: int,
+                    run_date: Optional[str] = None, attempted: Optional[Set[int]] = None) -> List[Dict]:
+    """Process a batch of apps.
+
+    Apps are fetched by MAX_WORKERS threads at once; the shared token bucket, not the
+    thread count, decides the request rate, so the workers only hide network latency.
+    The fetched details are then parsed and tag-matched in-process; after the basic pre-filter
+    only a handful of apps per batch get that far.
+
+    run_date and attempted should be computed once per run by the caller; they default to
+    today's date and a fresh read of attempted.sqlite for one-off calls.
+    """
     results = []
-    session = requests.Session()
+    session = SESSION
+    run_date = run_date or current_run_date()
+    if attempted is None:
+        attempted = load_attempted(run_date)
     
     logger.info(f"Processing batch {batch_num}/{total_batches} with {len(app_batch)} apps...")
     
-    for i, appid in enumerate(app_batch):
-        try:
-            result = process_app(appid, session)
-            if result:
-                results.append(result)
-                logger.info(f"✓ Found match: {result['name']} (tags: {result['target_tags_found']})")
-        except Exception as e:
-            logger.warning(f"Error processing app {appid}: {e}")
-        
-        # Progress update every 50 apps
-        if (i + 1) % 50 == 0:
-            logger.info(f"  Batch {batch_num} progress: {i + 1}/{len(app_batch)} apps processed")
+    # Skip apps an interrupted run already finished on run_date
+    if attempted:
+        remaining = [appid for appid in app_batch if appid not in attempted]
+        if len(remaining) < len(app_batch):
+            logger.info(f"  Batch {batch_num}: skipping {len(app_batch) - len(remaining)} apps already checked today")
+        app_batch = remaining
+    
+    # Cheap batched type/release check first; only survivors get a full details fetch
+    total_in_batch = len(app_batch)
+    survivors = prefilter_unreleased(app_batch, session)
+    survivor_set = set(survivors)
+    mark_attempted(run_date, [(appid, "rejected") for appid in app_batch if appid not in survivor_set])
+    app_batch = survivors
+    logger.info(f"  Batch {batch_num}: {len(app_batch)}/{total_in_batch} apps left after the basic pre-filter")
+    
+    # Network phase: threads fetch (or read from the cache) the full details
+    details_list = []
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        for i, details in enumerate(pool.map(lambda appid: _fetch_details_safely(appid, session), app_batch)):
+            details_list.append(details)
+            
+            # Progress update every 50 apps
+            if (i + 1) % 50 == 0:
+                logger.info(f"  Batch {batch_num} progress: {i + 1}/{len(app_batch)} apps fetched")
+    
+    # CPU phase: parse and tag-match the fetched details
+    for appid, details in zip(app_batch, details_list):
+        result = _parse_and_match_safely(appid, details, run_date)
+        if result:
+            results.append(result)
+            append_checkpoint(run_date, result)
+            mark_attempted(run_date, [(appid, "match")])
+            logger.info(f"✓ Found match: {result['name']} (tags: {result['target_tags_found']})")
+        elif get_cached_details(appid)[0]:
+            # Only resolved lookups count as done; rate-limited/failed ones are retried on restart
+            mark_attempted(run_date, [(appid, "no_match")])
     
-    session.close()
     return results
 
 def export_results(results: List[Dict]) -> Path:
@@ -314,22 +689,31 @@ def export_results(results: List[Dict]) -> Path:
     today_str = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     file_path = EXPORT_DIR / f"steam_unreleased_tags_{today_str}.csv"
     
+    # Text fields are already cleaned in process_app; rows go out as tuples in FIELDS order
     with file_path.open("w", encoding="utf-8-sig", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=FIELDS)
-        writer.writeheader()
-        for row in results:
-            # Clean text fields
-            cleaned_row = {}
-            for key, value in row.items():
-                if isinstance(value, str) and value:
-                    if key in ['name', 'description', 'developers', 'publishers']:
-                        cleaned_row[key] = clean_text_content(value)
-                    else:
-                        cleaned_row[key] = value
-                else:
-                    cleaned_row[key] = value
-            writer.writerow(cleaned_row)
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        writer.writerows(map(_ROW_VALUES, results))
     
+    export_parquet(results, file_path.with_suffix(".parquet"))
+    return file_path
+
+def export_parquet(results: List[Dict], file_path: Path) -> Optional[Path]:
+    """Write a columnar Parquet copy of the results for analysis; skipped if pyarrow isn't installed."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        logger.info("pyarrow not installed, skipping the optional Parquet export")
+        return None
+    
+    # The CSV is already written; a bad column type must not take the run down with it
+    try:
+        table = pa.table({field: [row.get(field) for row in results] for field in FIELDS})
+        pq.write_table(table, file_path)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OSError) as e:
+        logger.warning(f"Parquet export failed, CSV only: {e}")
+        return None
     return file_path
 
 def main():
@@ -340,40 +724,51 @@ def main():
     # Get all Steam apps
     all_apps = fetch_full_applist()
     
-    # Filter out obvious non-games (some basic filtering by name patterns)
-    filtered_apps = []
-    for app in all_apps:
-        name = app.get('name', '').lower()
-        # Skip obvious non-games
-        if any(skip_word in name for skip_word in ['soundtrack', 'wallpaper', 'server', 'tool', 'sdk']):
-            continue
-        filtered_apps.append(app['appid'])
+    # No name-based blacklist: the basic pre-filter and is_unreleased_game check type=='game'
+    # authoritatively, and names like "... Survival Tool" are real games.
+    # Only the appids are needed from here on; free the full app list before the slow HTTP phase
+    filtered_apps = [app['appid'] for app in all_apps]
+    del all_apps
     
-    logger.info(f"Filtered to {len(filtered_apps)} potential games from {len(all_apps)} total apps")
+    logger.info(f"Checking {len(filtered_apps)} apps")
     
-    # Split into batches for processing
+    # Split into batches for processing; slices are cut lazily as batches are submitted
     batch_size = 500  # Process in smaller batches
-    batches = [filtered_apps[i:i + batch_size] for i in range(0, len(filtered_apps), batch_size)]
+    total_batches = (len(filtered_apps) + batch_size - 1) // batch_size
     
-    logger.info(f"Processing {len(batches)} batches of up to {batch_size} apps each...")
+    logger.info(f"Processing {total_batches} batches of up to {batch_size} apps each...")
     
     all_results = []
     
+    # One run date for the whole crawl, so a run that crosses midnight UTC keeps one checkpoint
+    run_date = current_run_date()
+    attempted = load_attempted(run_date)
+    
     # Process batches with very limited concurrency to avoid rate limiting
-    with ThreadPoolExecutor(max_workers=2) as executor:  # Very conservative thread count
-        future_to_batch = {
-            executor.submit(search_by_batch, batch, i + 1, len(batches)): i 
-            for i, batch in enumerate(batches)
-        }
-        
-        for future in as_completed(future_to_batch):
-            batch_idx = future_to_batch[future]
-            try:
-                batch_results = future.result()
-                all_results.extend(batch_results)
-                logger.info(f"Batch {batch_idx + 1} completed. Found {len(batch_results)} matches. Total so far: {len(all_results)}")
-            except Exception as e:
-                logger.error(f"Batch {batch_idx + 1} failed: {e}")
+    max_workers = 2  # Very conservative thread count
+    max_in_flight = max_workers * 2
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+        next_batch = 0
+        while next_batch < total_batches or pending:
+            # Top up to max_in_flight batches instead of queueing every batch up front
+            while next_batch < total_batches and len(pending) < max_in_flight:
+                batch = filtered_apps[next_batch * batch_size:(next_batch + 1) * batch_size]
+                pending[executor.submit(search_by_batch, batch, next_batch + 1, total_batches, run_date, attempted)] = next_batch
+                next_batch += 1
+            
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch_idx = pending.pop(future)
+                try:
+                    batch_results = future.result()
+                    all_results.extend(batch_results)
+                    logger.info(f"Batch {batch_idx + 1} completed. Found {len(batch_results)} matches. Total so far: {len(all_results)}")
+                except Exception as e:
+                    logger.error(f"Batch {batch_idx + 1} failed: {e}")
+    
+    # Include hits found by earlier, interrupted runs on run_date (the JSONL checkpoint holds them)
+    all_results = merge_checkpoint_results(all_results, run_date)
     
     # Export results
     if all_results: